@@ -1,10 +1,15 @@
 # 應用程式配置檔案
+import os
 
 # 問卷設定
 TOTAL_QUESTIONS = 4  # 問題總數，可以調整為任意數量
 MIN_QUESTIONS = 3    # 最少問題數
 MAX_QUESTIONS = 10   # 最多問題數
 
+# 會話設定（避免記憶體無限成長）
+SESSION_MAX_COUNT = 10000     # 最多保留的會話數，超過時淘汰最久未使用者
+SESSION_TTL_SECONDS = 3600    # 會話閒置超過此秒數即淘汰
+
 # 串流設定
 STREAM_DELAY = 0.03  # 字元間隔時間（秒）
 
@@ -17,3 +22,75 @@ GEMINI_ADVICE_MAX_TOKENS = 1024
 
 # 分析設定
 ENABLE_CONTEXT_ANALYSIS = True  # 是否啟用上下文分析（問題+回答）
+QUESTION_TRANSLATION_CACHE_SIZE = 256  # 問題英譯快取筆數（fallback 題目可跨使用者共用）
+
+# 情緒分析後端（可用環境變數 SENTIMENT_BACKEND 依部署切換）
+# finbert：中譯英 + ProsusAI/finbert（兩個模型串接）
+# chinese：中文金融情緒模型，直接分析中文、省去翻譯
+# stub：不載入模型，一律回傳中性（離線測試用）
+SENTIMENT_BACKEND = os.getenv("SENTIMENT_BACKEND", "finbert")
+# 模型名稱與裝置皆可用環境變數覆寫（例如記憶體測試改用小型模型）
+FINBERT_MODEL_NAME = os.getenv("FINBERT_MODEL_NAME", "ProsusAI/finbert")
+CHINESE_SENTIMENT_MODEL_NAME = os.getenv("CHINESE_SENTIMENT_MODEL_NAME",
+                                         "yiyanghkust/finbert-tone-chinese")
+# 中文模型的標籤順序（依 id，逗號分隔，例如 "neutral,positive,negative"）；
+# 模型的 id2label 只有 LABEL_0.. 等無意義名稱時必須設定，留空則依標籤名稱判斷
+CHINESE_SENTIMENT_LABELS = os.getenv("CHINESE_SENTIMENT_LABELS", "")
+# pipeline 使用的裝置（0 = 第一張 GPU，-1 = CPU）
+MODEL_DEVICE = int(os.getenv("MODEL_DEVICE", "0"))
+TRANSLATOR_ZH_EN_MODEL = os.getenv("TRANSLATOR_ZH_EN_MODEL",
+                                   "Helsinki-NLP/opus-mt-zh-en")
+TRANSLATOR_EN_ZH_MODEL = os.getenv("TRANSLATOR_EN_ZH_MODEL",
+                                   "Helsinki-NLP/opus-mt-en-zh")
+
+# 模型快照目錄（python -m tools.snapshot_models save 產生的 safetensors）
+# 目錄存在時直接 mmap 載入，多個 worker 共用 OS page cache 中的權重
+MODEL_SNAPSHOT_DIR = os.getenv("MODEL_SNAPSHOT_DIR", "model_snapshots")
+
+# 流量控制（admission control）
+# 情緒分析：超過佇列上限或排隊逾時即回傳 503 + Retry-After
+ANALYSIS_MAX_CONCURRENCY = 1  # 同時執行的模型推論數
+ANALYSIS_MAX_QUEUE = 32       # 等待佇列上限
+ANALYSIS_QUEUE_TIMEOUT = 5.0  # 排隊等待上限（秒）
+# Gemini：超過佇列上限或排隊逾時時改用 fallback 題目 / 建議（降級模式）
+GEMINI_MAX_CONCURRENCY = 8
+GEMINI_MAX_QUEUE = 16
+GEMINI_QUEUE_TIMEOUT = 2.0
+RETRY_AFTER_SECONDS = 2  # 503 回應的 Retry-After（秒）
+
+# Gemini 韌性設定
+GEMINI_QUESTION_DEADLINE = 3.0   # 問題生成時限（秒，取得執行槽後起算），逾時改用本地模板
+GEMINI_ADVICE_DEADLINE = 12.0    # 建議生成總時限（秒）
+GEMINI_HEDGE_ENABLED = True      # 問題生成超過延遲百分位時送出第二個請求
+GEMINI_HEDGE_PERCENTILE = 0.95
+GEMINI_HEDGE_BUDGET = 0.1        # hedged 請求最多佔呼叫數的比例
+GEMINI_BREAKER_FAILURES = 5      # 連續逾時 / 錯誤次數達此值即開啟斷路器
+GEMINI_BREAKER_COOLDOWN = 30.0   # 斷路器冷卻時間（秒）
+
+# 流量錄製（record-and-replay 壓測用），設定 TRAFFIC_RECORD_PATH 即啟用
+TRAFFIC_RECORD_PATH = os.getenv("TRAFFIC_RECORD_PATH", "")
+
+# 完成問卷的匯出（背景批次寫入輪替的 JSONL 檔）
+EXPORT_ENABLED = os.getenv("EXPORT_ENABLED", "1") == "1"
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+EXPORT_QUEUE_SIZE = 1000        # 匯出佇列上限，滿了就丟棄（不阻塞請求）
+EXPORT_BATCH_SIZE = 100         # 每批最多寫入筆數
+EXPORT_FLUSH_INTERVAL = 2.0     # 最長等待秒數，逾時即寫入已收集的資料
+EXPORT_MAX_FILE_RECORDS = 10000  # 每個檔案的筆數上限，超過即輪替
+
+# 請求 profiling（預設停用；停用時不註冊任何中介軟體，零額外成本）
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILING_ADMIN_TOKEN = os.getenv("PROFILING_ADMIN_TOKEN", "")
+# 帶有 X-Profile-Request: <PROFILING_ADMIN_TOKEN> 的請求一律擷取
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+# 延遲超過此秒數的請求自動保留 trace（0 = 停用；啟用時每個請求都會取樣）
+PROFILING_SLOW_THRESHOLD = float(os.getenv("PROFILING_SLOW_THRESHOLD", "0"))
+PROFILING_BUFFER_SIZE = 20    # 保留最近幾筆 trace
+PROFILING_INTERVAL = 0.005    # 堆疊取樣間隔（秒）
+PROFILING_SAMPLE_BUFFER = 50000  # 共用的堆疊取樣環形緩衝（筆），約數分鐘的取樣
+
+# 持久快取（SQLite，多個 worker 共用），存放翻譯結果與情緒分數
+# key 含模型版本，模型或快照更新後舊資料自動失效
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1") == "1"
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "cache/analysis_cache.sqlite3")
+CACHE_MAX_ENTRIES = 100000  # 每個 namespace 的筆數上限，超過時淘汰最久未使用者
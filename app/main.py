@@ -1,9 +1,14 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
+import json
 import time
 
 # 導入應用模組
 from routers.questionnaire import router as questionnaire_router
+from services import analysisService, geminiService, exportService
+from config import TRAFFIC_RECORD_PATH, PROFILING_ENABLED
+from utils.TrafficRecorder import RECORDED_PATHS, TrafficRecorder
 import models
 
 # FastAPI 應用
@@ -29,6 +34,112 @@ async def log_requests(request: Request, call_next):
     print(f"回應: {response.status_code} - 耗時: {process_time:.3f}s")
     return response
 
+
+def _on_body_complete(response, callback):
+    """
+    包裝回應的 body_iterator，在內容全部送出（或連線中斷）後呼叫 callback。
+    call_next 回傳時只送出了 header，串流回應（stream-question）
+    需等 body 結束才能量到完整延遲。
+    """
+    body_iterator = response.body_iterator
+
+    async def wrapped():
+        try:
+            async for chunk in body_iterator:
+                yield chunk
+        finally:
+            callback()
+
+    response.body_iterator = wrapped()
+    return response
+
+
+def _str_field(payload, key: str):
+    """只錄製字串欄位；型別錯誤的請求交由 FastAPI 回 422"""
+    value = payload.get(key) if isinstance(payload, dict) else None
+    return value if isinstance(value, str) else None
+
+
+# 流量錄製中介軟體（僅在設定 TRAFFIC_RECORD_PATH 時啟用）
+trafficRecorder = (TrafficRecorder(TRAFFIC_RECORD_PATH)
+                   if TRAFFIC_RECORD_PATH else None)
+
+if trafficRecorder:
+    @app.middleware("http")
+    async def record_traffic(request: Request, call_next):
+        path = request.url.path
+        if path not in RECORDED_PATHS:
+            return await call_next(request)
+
+        arrival = trafficRecorder.now()
+        start_time = time.time()
+        body = await request.body()
+        response = await call_next(request)
+
+        try:
+            payload = json.loads(body) if body else {}
+        except ValueError:
+            payload = {}
+        session_id = _str_field(payload, "session_id")
+        answer = _str_field(payload, "answer")
+
+        # /start 的 session_id 在回應中，需讀出回應內容再重建回應
+        if path == "/questionnaire/start" and response.status_code == 200:
+            content = b"".join([chunk async for chunk
+                                in response.body_iterator])
+            try:
+                session_id = _str_field(json.loads(content), "session_id")
+            except ValueError:
+                session_id = None
+            response = Response(content=content,
+                                status_code=response.status_code,
+                                headers=dict(response.headers))
+
+        status = response.status_code
+
+        def record():
+            # 錄製失敗只記錄警告，不可影響回應
+            try:
+                trafficRecorder.record(arrival, path, session_id, answer,
+                                       status, time.time() - start_time)
+            except Exception as e:
+                print(f"⚠️ 流量錄製失敗: {e}")
+
+        return _on_body_complete(response, record)
+
+# 請求 profiling 中介軟體與管理端點（僅在 PROFILING_ENABLED 時註冊）
+if PROFILING_ENABLED:
+    from routers.admin import router as admin_router, requestProfiler
+
+    @app.on_event("startup")
+    async def install_profiler():
+        # 讓取樣能辨識 event loop 上的請求 task 與其 to_thread worker
+        requestProfiler.install(asyncio.get_running_loop())
+
+    @app.middleware("http")
+    async def profile_requests(request: Request, call_next):
+        capture = requestProfiler.begin(
+            request.headers.get("x-profile-request"))
+        if capture is None:
+            return await call_next(request)
+
+        start_time = time.time()
+
+        def finish(status: int):
+            requestProfiler.finish(capture, request.method, request.url.path,
+                                   status, time.time() - start_time)
+
+        try:
+            response = await call_next(request)
+        except BaseException:
+            finish(500)
+            raise
+        # 串流回應需等 body 送完才結束擷取，延遲與取樣區間才完整
+        return _on_body_complete(response,
+                                 lambda: finish(response.status_code))
+
+    app.include_router(admin_router)
+
 # 註冊路由
 app.include_router(questionnaire_router)
 
@@ -44,9 +155,19 @@ async def startup_event():
     except Exception as e:
         print(f"⚠️  分析模型載入失敗: {e}")
 
+    exportService.start()
     print("🚀 心理問卷 API 啟動完成")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """應用程式關閉時執行"""
+    # 寫完匯出佇列中剩餘的會話
+    exportService.close()
+    if trafficRecorder:
+        trafficRecorder.close()
+
+
 @app.get("/")
 def root():
     """根路徑"""
@@ -58,6 +179,8 @@ def root():
             "/questionnaire/answer",
             "/questionnaire/stream-question",
             "/questionnaire/save-question",
+            "/questionnaire/submit-bulk",
+            "/questionnaire/ws",
         ],
     }
 
@@ -65,4 +188,16 @@ def root():
 @app.get("/health")
 def health_check():
     """健康檢查端點"""
-    return {"status": "healthy", "service": "psychology-questionnaire-api"}
+    return {
+        "status": "healthy",
+        "service": "psychology-questionnaire-api",
+        # 流量控制狀態（執行中 / 排隊中 / 已拒絕數）
+        "admission": {
+            "analysis": analysisService.limiter.stats(),
+            "gemini": geminiService.limiter.stats(),
+        },
+        "gemini_breaker": geminiService.breaker.stats(),
+        "export": exportService.stats(),
+        "sentiment_cache": (analysisService.sentiment_cache.stats()
+                            if analysisService.sentiment_cache else None),
+    }
@@ -0,0 +1,174 @@
+from typing import Dict, List, Optional, Type
+from config import (FINBERT_MODEL_NAME, CHINESE_SENTIMENT_MODEL_NAME,
+                    CHINESE_SENTIMENT_LABELS, TRANSLATOR_ZH_EN_MODEL,
+                    MODEL_DEVICE)
+
+SENTIMENT_LABELS = ("negative", "neutral", "positive")
+
+
+def build_label_map(id2label: Dict[int, str],
+                    label_order: str = "") -> Dict[str, str]:
+    """
+    建立模型標籤 -> negative / neutral / positive 的對應表。
+    label_order 依 id 順序指定情緒（覆寫模型的標籤名稱）；
+    任何標籤無法對應、或三種情緒不齊全時拋出 ValueError，
+    避免下游把無法辨識的標籤全部當成 0 分而默默回傳中性結果。
+    """
+    id2label = {int(i): label for i, label in id2label.items()}
+    ids = sorted(id2label)
+    if label_order:
+        names = [name.strip().lower() for name in label_order.split(",")]
+        if len(names) != len(ids):
+            raise ValueError(f"標籤順序 {names} 與模型的 {len(ids)} 個標籤數量不符")
+    else:
+        names = [id2label[i].lower() for i in ids]
+
+    mapping = {}
+    for i, name in zip(ids, names):
+        target = next((s for s in SENTIMENT_LABELS if name.startswith(s[:3])),
+                      None)
+        if target is None:
+            raise ValueError(f"無法對應模型標籤 {id2label[i]!r}，"
+                             f"請設定 CHINESE_SENTIMENT_LABELS（依 id 順序）")
+        mapping[id2label[i]] = target
+    if sorted(mapping.values()) != sorted(SENTIMENT_LABELS):
+        raise ValueError(f"模型標籤需恰好對應 negative / neutral / positive: "
+                         f"{mapping}")
+    return mapping
+
+
+class SentimentBackend:
+    """
+    情緒分析後端的共用介面。
+    analyze_batch 的每筆結果皆為 text-classification pipeline 的輸出格式
+    （[{"label": ..., "score": ...}, ...]），供 AnalysisService 統一解析。
+    """
+    name = "base"
+    needs_translation = False  # 是否需要先將中文翻譯為英文
+    cacheable = True  # 結果是否可寫入持久快取
+    model_name = ""
+
+    def __init__(self):
+        self.translator = None
+
+    @property
+    def version(self) -> str:
+        """模型版本字串，供持久快取判斷是否失效"""
+        from utils.ModelLoader import model_version
+        return f"{self.name}:{model_version(self.model_name)}"
+
+    def analyze_batch(self, answers: List[str],
+                      questions: Optional[List[str]] = None,
+                      questions_en: Optional[List[str]] = None
+                      ) -> List[List[Dict]]:
+        raise NotImplementedError
+
+
+class FinbertBackend(SentimentBackend):
+    """中譯英（MarianMT）+ ProsusAI/finbert 的雙模型串接"""
+    name = "finbert"
+    needs_translation = True
+
+    def __init__(self, model_name: str = FINBERT_MODEL_NAME):
+        super().__init__()
+        from transformers import AutoModelForSequenceClassification, pipeline
+        from utils.ModelLoader import load_model, load_tokenizer
+        from utils.Translate import Translator
+
+        self.model_name = model_name
+        self.tokenizer = load_tokenizer(self.model_name)
+        self.model = load_model(AutoModelForSequenceClassification,
+                                self.model_name)
+        self.classifier = pipeline("text-classification", model=self.model,
+                                   tokenizer=self.tokenizer,
+                                   top_k=None, device=MODEL_DEVICE)
+        self.translator = Translator()
+
+    @property
+    def version(self) -> str:
+        # 翻譯模型更新也會改變 FinBERT 的輸入，需一併納入版本
+        from utils.ModelLoader import model_version
+        return (f"{self.name}:{model_version(self.model_name)}"
+                f"+{model_version(TRANSLATOR_ZH_EN_MODEL)}")
+
+    def analyze_batch(self, answers, questions=None, questions_en=None):
+        answers_en = self.translator.translate_batch(answers)
+        inputs = []
+        for i, answer_en in enumerate(answers_en):
+            question_en = questions_en[i] if questions_en else ""
+            # 未提供英文問題時才翻譯中文問題
+            if not question_en and questions and questions[i]:
+                question_en = self.translator.translate_zn_en(questions[i])
+            if question_en:
+                inputs.append(f"Question: {question_en} Answer: {answer_en}")
+            else:
+                inputs.append(answer_en)
+        return self.classifier(inputs, truncation=True)
+
+
+class ChineseSentimentBackend(SentimentBackend):
+    """直接分析中文的金融情緒模型，省去翻譯步驟"""
+    name = "chinese"
+    needs_translation = False
+
+    def __init__(self, model_name: str = CHINESE_SENTIMENT_MODEL_NAME):
+        super().__init__()
+        from transformers import AutoModelForSequenceClassification, pipeline
+        from utils.ModelLoader import load_model, load_tokenizer
+
+        self.model_name = model_name
+        self.tokenizer = load_tokenizer(self.model_name)
+        self.model = load_model(AutoModelForSequenceClassification,
+                                self.model_name)
+        self.classifier = pipeline("text-classification", model=self.model,
+                                   tokenizer=self.tokenizer,
+                                   top_k=None, device=MODEL_DEVICE)
+        # 載入時即確認標籤可對應，無法對應時直接失敗而非輸出全 0 分數
+        self.label_map = build_label_map(self.model.config.id2label,
+                                         CHINESE_SENTIMENT_LABELS)
+        print(f"中文情緒模型標籤對應: {self.label_map}")
+
+    def analyze_batch(self, answers, questions=None, questions_en=None):
+        inputs = []
+        for i, answer in enumerate(answers):
+            question = questions[i] if questions else ""
+            if question:
+                inputs.append(f"問題：{question.strip()} 回答：{answer.strip()}")
+            else:
+                inputs.append(answer.strip())
+        results = self.classifier(inputs, truncation=True)
+        return [[{"label": self.label_map[item["label"]],
+                  "score": item["score"]} for item in items]
+                for items in results]
+
+
+class StubSentimentBackend(SentimentBackend):
+    """不載入任何模型、一律回傳中性的後端（離線測試與壓測用）"""
+    name = "stub"
+    needs_translation = False
+    cacheable = False
+    model_name = "stub"
+
+    def analyze_batch(self, answers, questions=None, questions_en=None):
+        return [[{"label": "neutral", "score": 1.0},
+                 {"label": "positive", "score": 0.0},
+                 {"label": "negative", "score": 0.0}]
+                for _ in answers]
+
+
+# 後端註冊表：名稱 -> 類別
+SENTIMENT_BACKENDS: Dict[str, Type[SentimentBackend]] = {
+    FinbertBackend.name: FinbertBackend,
+    ChineseSentimentBackend.name: ChineseSentimentBackend,
+    StubSentimentBackend.name: StubSentimentBackend,
+}
+
+
+def create_backend(name: str) -> SentimentBackend:
+    """依名稱建立情緒分析後端"""
+    backend_cls = SENTIMENT_BACKENDS.get(name)
+    if backend_cls is None:
+        raise ValueError(
+            f"未知的情緒分析後端: {name}"
+            f"（可用: {', '.join(SENTIMENT_BACKENDS)}）")
+    return backend_cls()
@@ -1,21 +1,40 @@
-from transformers import (AutoTokenizer,
-                          AutoModelForSequenceClassification, pipeline)
-from utils.Translate import Translator
+from config import SENTIMENT_BACKEND
+from .SentimentBackends import create_backend
 
 
 class SentimentModel:
-    def __init__(self):
-        self.model_name = "ProsusAI/finbert"
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-        self.model = AutoModelForSequenceClassification.from_pretrained(
-            self.model_name)
-        self.classifier = pipeline("text-classification", model=self.model,
-                                   tokenizer=self.tokenizer,
-                                   top_k=None, device=0)
-        self.translator = Translator()
-
-    def analyze(self, text_zh):
-        text_en = self.translator.translate_zn_en(text_zh)
-        # print("翻譯後的英文文本:", text_en)
-        result = self.classifier(text_en)
-        return result
+    def __init__(self, backend_name: str = SENTIMENT_BACKEND):
+        self.backend = create_backend(backend_name)
+        self.backend_name = self.backend.name
+        self.model_name = self.backend.model_name
+        print(f"情緒分析後端: {self.backend_name} ({self.model_name})")
+
+    @property
+    def needs_translation(self) -> bool:
+        return self.backend.needs_translation
+
+    @property
+    def cacheable(self) -> bool:
+        return self.backend.cacheable
+
+    @property
+    def version(self) -> str:
+        return self.backend.version
+
+    @property
+    def translator(self):
+        return self.backend.translator
+
+    def analyze(self, text_zh, question="", question_en=""):
+        """
+        分析單筆中文回答的情緒。
+        question / question_en 為上下文問題，翻譯型後端使用已存好的英文問題，
+        中文後端則直接使用中文問題。
+        """
+        return self.analyze_batch([text_zh], [question], [question_en])[0]
+
+    def analyze_batch(self, texts_zh, questions=None, questions_en=None):
+        """批次分析多筆回答，回傳與輸入順序相同的結果列表"""
+        if not texts_zh:
+            return []
+        return self.backend.analyze_batch(texts_zh, questions, questions_en)
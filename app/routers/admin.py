@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from typing import Any, Dict, List, Optional
+from config import (PROFILING_ADMIN_TOKEN, PROFILING_SAMPLE_RATE,
+                    PROFILING_SLOW_THRESHOLD, PROFILING_BUFFER_SIZE,
+                    PROFILING_INTERVAL, PROFILING_SAMPLE_BUFFER)
+from utils.Profiler import RequestProfiler
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+requestProfiler = RequestProfiler(
+    admin_token=PROFILING_ADMIN_TOKEN,
+    sample_rate=PROFILING_SAMPLE_RATE,
+    slow_threshold=PROFILING_SLOW_THRESHOLD,
+    buffer_size=PROFILING_BUFFER_SIZE,
+    interval=PROFILING_INTERVAL,
+    sample_buffer=PROFILING_SAMPLE_BUFFER,
+)
+
+
+def _check_token(token: Optional[str]):
+    if not PROFILING_ADMIN_TOKEN or token != PROFILING_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="權限不足")
+
+
+@router.get("/profiles")
+def list_profiles(x_admin_token: Optional[str] = Header(None)
+                  ) -> List[Dict[str, Any]]:
+    """列出最近擷取的請求 profile（新到舊）"""
+    _check_token(x_admin_token)
+    return requestProfiler.list_traces()
+
+
+@router.get("/profiles/{trace_id}")
+def get_profile(trace_id: str, format: str = "json",
+                x_admin_token: Optional[str] = Header(None)):
+    """
+    取得單一 profile。format=folded 時回傳 flamegraph.pl / speedscope
+    可直接讀取的 folded stack 文字。
+    """
+    _check_token(x_admin_token)
+    trace = requestProfiler.get_trace(trace_id)
+    if not trace:
+        raise HTTPException(status_code=404, detail="profile 不存在")
+    if format == "folded":
+        return PlainTextResponse("\n".join(
+            f"{stack} {count}" for stack, count in trace["stacks"]))
+    return trace
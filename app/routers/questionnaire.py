@@ -1,16 +1,75 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.responses import StreamingResponse
 from schemas.questionnaire import (StartResponse, AnswerRequest,
                                    NextQuestionResponse, StreamQuestionRequest,
-                                   SaveQuestionRequest)
-from config import TOTAL_QUESTIONS
+                                   SaveQuestionRequest, BulkAnswerRequest,
+                                   BulkAnswerResponse)
+from config import (TOTAL_QUESTIONS, MIN_QUESTIONS, MAX_QUESTIONS,
+                    SESSION_TTL_SECONDS)
 from typing import Dict, Any
+import asyncio
 import json
-from services import analysisService, geminiService, questionnaireService
+import time
+from services import (analysisService, geminiService, questionnaireService,
+                      exportService)
+from services.questionnaire_service import SessionExpired
+from utils.Admission import AdmissionRejected
 
 router = APIRouter(prefix="/questionnaire", tags=["questionnaire"])
 
 
+def _overloaded(e: AdmissionRejected) -> HTTPException:
+    """流量過大時的 503 回應，附上 Retry-After"""
+    return HTTPException(status_code=503, detail="伺服器忙碌中，請稍後再試",
+                         headers={"Retry-After": str(e.retry_after)})
+
+
+def _session_expired() -> HTTPException:
+    """作答途中會話被淘汰（閒置逾時或數量上限）時的 404 回應"""
+    return HTTPException(status_code=404, detail="會話已過期，請重新開始")
+
+
+async def _complete_questionnaire(session_id: str) -> Dict[str, Any]:
+    """
+    問卷完成：由會話累計值取得 profile 與摘要，生成建議與分類。
+    結果保存在會話中，同一會話重複完成（例如 WebSocket 接續已完成的會話）
+    時直接回傳，不再呼叫 Gemini 或重複匯出。
+    """
+    result = questionnaireService.get_result(session_id)
+    if result is not None:
+        return result
+
+    all_responses = questionnaireService.get_all_responses(session_id)
+    aggregate = questionnaireService.get_aggregate(session_id)
+    if aggregate is None:
+        raise SessionExpired(session_id)
+    advice = await geminiService.generate_content(all_responses, aggregate)
+
+    # 後端計算 profile 與分類（累計值，O(1)）；生成建議期間會話可能被淘汰
+    profile = questionnaireService.get_profile(session_id)
+    if profile is None:
+        raise SessionExpired(session_id)
+    investor_type = analysisService.classify_investor(profile)
+
+    # 放入匯出佇列，實際寫檔由背景執行緒處理
+    exportService.enqueue({
+        "session_id": session_id,
+        "completed_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "responses": list(all_responses),
+        "sentiment_average": aggregate.sentiment_average(),
+        "profile": profile,
+        "investor_type": investor_type,
+        "advice": advice
+    })
+    result = {
+        "advice": advice,
+        "profile": profile,
+        "investor_type": investor_type
+    }
+    questionnaireService.save_result(session_id, result)
+    return result
+
+
 @router.post("/start", response_model=StartResponse)
 async def start_questionnaire() -> StartResponse:
     """開始問卷調查"""
@@ -26,7 +85,8 @@ async def start_questionnaire() -> StartResponse:
 
         # 保存生成的問題
         questionnaireService.save_generated_question(
-            session_id, first_question)
+            session_id, first_question,
+            await analysisService.translate_question_async(first_question))
 
         return StartResponse(
             session_id=session_id,
@@ -34,6 +94,9 @@ async def start_questionnaire() -> StartResponse:
             question_number=1,
             total_questions=TOTAL_QUESTIONS
         )
+    except SessionExpired:
+        # 生成第一題期間會話即被淘汰（會話數量已達上限）
+        raise _session_expired()
     except Exception as e:
         print(f"開始問卷時發生錯誤: {e}")
         raise HTTPException(status_code=500, detail="伺服器內部錯誤")
@@ -48,10 +111,13 @@ async def submit_answer(request: AnswerRequest) -> NextQuestionResponse:
         if not current_question:
             raise HTTPException(status_code=404, detail="會話不存在或已完成")
 
-        sentiment_scores, stress_scores = (analysisService
-                                           .analyze_user_response(
-                                               request.answer,
-                                               current_question))
+        current_question_en = questionnaireService.get_current_question_en(
+            request.session_id)
+        sentiment_scores, stress_scores = (
+            await analysisService.analyze_user_response_async(
+                request.answer,
+                current_question,
+                current_question_en))
 
         success = questionnaireService.save_response(
             request.session_id,
@@ -65,20 +131,8 @@ async def submit_answer(request: AnswerRequest) -> NextQuestionResponse:
 
         # 若問卷完成，回傳 advice + server-side profile 與 investor_type
         if questionnaireService.is_questionnaire_complete(request.session_id):
-            all_responses = questionnaireService.get_all_responses(
-                request.session_id)
-            advice = await geminiService.generate_content(all_responses)
-
-            # 後端計算 profile 與分類
-            profile = analysisService.compute_profile(all_responses)
-            investor_type = analysisService.classify_investor(profile)
-
-            return NextQuestionResponse(
-                has_next_question=False,
-                advice=advice,
-                profile=profile,
-                investor_type=investor_type
-            )
+            result = await _complete_questionnaire(request.session_id)
+            return NextQuestionResponse(has_next_question=False, **result)
         else:
             progress = questionnaireService.get_progress(request.session_id)
             all_responses = questionnaireService.get_all_responses(
@@ -91,17 +145,24 @@ async def submit_answer(request: AnswerRequest) -> NextQuestionResponse:
             )
 
             questionnaireService.save_generated_question(
-                request.session_id, next_question)
+                request.session_id, next_question,
+                await analysisService.translate_question_async(next_question))
 
             return NextQuestionResponse(
                 has_next_question=True,
                 question=next_question,
                 question_number=progress["current"] + 1,
-                total_questions=progress["total"]
+                total_questions=progress["total"],
+                partial_profile=questionnaireService.get_profile(
+                    request.session_id)
             )
 
     except HTTPException:
         raise
+    except SessionExpired:
+        raise _session_expired()
+    except AdmissionRejected as e:
+        raise _overloaded(e)
     except Exception as e:
         print(f"提交答案時發生錯誤: {e}")
         raise HTTPException(status_code=500, detail="伺服器內部錯誤")
@@ -130,8 +191,15 @@ async def stream_question(request: StreamQuestionRequest):
             ):
                 # 如果問題生成完成，保存問題到會話
                 if chunk.get("done") and chunk.get("question"):
-                    questionnaireService.save_generated_question(
-                        request.session_id, chunk["question"])
+                    try:
+                        questionnaireService.save_generated_question(
+                            request.session_id, chunk["question"],
+                            await analysisService.translate_question_async(
+                                chunk["question"]))
+                    except SessionExpired:
+                        # header 已送出，改以串流內容通知用戶端
+                        chunk = {"done": True, "error": 404,
+                                 "detail": "會話已過期，請重新開始"}
 
                 yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
 
@@ -156,10 +224,13 @@ async def save_question(request: SaveQuestionRequest) -> Dict[str, Any]:
         if not current_question:
             raise HTTPException(status_code=404, detail="會話不存在或已完成")
 
+        current_question_en = questionnaireService.get_current_question_en(
+            request.session_id)
         sentiment_scores, stress_scores = (
-            analysisService.analyze_user_response(
+            await analysisService.analyze_user_response_async(
                 request.answer,
-                current_question
+                current_question,
+                current_question_en
             )
         )
 
@@ -177,19 +248,11 @@ async def save_question(request: SaveQuestionRequest) -> Dict[str, Any]:
             request.session_id)
 
         if is_complete:
-            all_responses = questionnaireService.get_all_responses(
-                request.session_id)
-            advice = await geminiService.generate_content(all_responses)
-            # 後端計算 profile 與分類
-            profile = analysisService.compute_profile(all_responses)
-            investor_type = analysisService.classify_investor(profile)
-
+            result = await _complete_questionnaire(request.session_id)
             return {
                 "success": True,
                 "is_complete": True,
-                "advice": advice,
-                "profile": profile,
-                "investor_type": investor_type
+                **result
             }
         else:
             progress = questionnaireService.get_progress(request.session_id)
@@ -197,11 +260,227 @@ async def save_question(request: SaveQuestionRequest) -> Dict[str, Any]:
                 "success": True,
                 "is_complete": False,
                 "next_question_number": progress["current"] + 1,
-                "total_questions": progress["total"]
+                "total_questions": progress["total"],
+                "partial_profile": questionnaireService.get_profile(
+                    request.session_id)
             }
 
     except HTTPException:
         raise
+    except SessionExpired:
+        raise _session_expired()
+    except AdmissionRejected as e:
+        raise _overloaded(e)
     except Exception as e:
         print(f"儲存問題時發生錯誤: {e}")
         raise HTTPException(status_code=500, detail="伺服器內部錯誤")
+
+
+@router.post("/submit-bulk", response_model=BulkAnswerResponse)
+async def submit_bulk(request: BulkAnswerRequest) -> BulkAnswerResponse:
+    """一次提交整份問卷的（問題, 回答），批次分析後回傳結果"""
+    try:
+        count = len(request.answers)
+        if count < MIN_QUESTIONS or count > MAX_QUESTIONS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"回答數需介於 {MIN_QUESTIONS} 到 {MAX_QUESTIONS} 題")
+
+        session_id = request.session_id
+        if session_id:
+            if not questionnaireService.get_session(session_id):
+                raise HTTPException(status_code=404, detail="會話不存在")
+        else:
+            session_id = questionnaireService.create_session()
+
+        questions = [item.question for item in request.answers]
+        answers = [item.answer for item in request.answers]
+
+        # 整批送進情緒分析，只排一次隊、跑一次模型
+        scores = await analysisService.analyze_batch_async(answers, questions)
+
+        responses = [
+            {
+                "question": question,
+                "answer": answer,
+                "sentiment": sentiment_scores,
+                "stress": stress_scores
+            }
+            for question, answer, (sentiment_scores, stress_scores)
+            in zip(questions, answers, scores)
+        ]
+        if not questionnaireService.save_bulk_responses(session_id,
+                                                        responses):
+            raise HTTPException(status_code=400, detail="儲存回答失敗")
+
+        result = await _complete_questionnaire(session_id)
+        return BulkAnswerResponse(
+            session_id=session_id,
+            total_questions=count,
+            **result
+        )
+
+    except HTTPException:
+        raise
+    except SessionExpired:
+        raise _session_expired()
+    except AdmissionRejected as e:
+        raise _overloaded(e)
+    except Exception as e:
+        print(f"批次提交時發生錯誤: {e}")
+        raise HTTPException(status_code=500, detail="伺服器內部錯誤")
+
+
+async def _ws_send_question(websocket: WebSocket, session_id: str):
+    """串流推送當前問題；尚未生成時先生成並儲存到會話"""
+    progress = questionnaireService.get_progress(session_id)
+    question = questionnaireService.get_current_question(session_id)
+
+    if not question:
+        all_responses = questionnaireService.get_all_responses(session_id)
+        async for chunk in geminiService.stream_question_generation(
+            progress["current"] + 1,
+            progress["total"],
+            all_responses
+        ):
+            if chunk.get("done"):
+                question = chunk["question"]
+            else:
+                await websocket.send_json({"type": "question_chunk",
+                                           "text": chunk["text"]})
+        questionnaireService.save_generated_question(
+            session_id, question,
+            await analysisService.translate_question_async(question))
+
+    await websocket.send_json({
+        "type": "question",
+        "question": question,
+        "question_number": progress["current"] + 1,
+        "total_questions": progress["total"]
+    })
+
+
+async def _ws_receive_message(websocket: WebSocket):
+    """
+    接收一則用戶端訊息並解析 JSON；二進位 frame 或 JSON 格式錯誤時回傳 None。
+    閒置超過 SESSION_TTL_SECONDS（會話此時也已逾時）時拋出 asyncio.TimeoutError。
+    """
+    frame = await asyncio.wait_for(websocket.receive(), SESSION_TTL_SECONDS)
+    if frame["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(frame.get("code", 1000))
+    text = frame.get("text")
+    if text is None:
+        return None
+    try:
+        return json.loads(text)
+    except ValueError:
+        return None
+
+
+@router.websocket("/ws")
+async def questionnaire_websocket(websocket: WebSocket):
+    """
+    以單一 WebSocket 連線完成整份問卷。
+    伺服器推送：session → question_chunk* → question → (收到 answer)
+    → progress → analysis → ... → result；錯誤時推送 error。
+    用戶端送出：{"type": "answer", "answer": "..."}（文字訊息）；
+    閒置超過 SESSION_TTL_SECONDS 時推送 error（408）並關閉連線。
+    可用 ?session_id= 接續既有會話；會話已完成時直接推送保存的 result。
+    """
+    await websocket.accept()
+    try:
+        session_id = websocket.query_params.get("session_id")
+        if session_id and not questionnaireService.get_session(session_id):
+            await websocket.send_json({"type": "error", "code": 404,
+                                       "detail": "會話不存在"})
+            await websocket.close()
+            return
+        if not session_id:
+            session_id = questionnaireService.create_session()
+
+        progress = questionnaireService.get_progress(session_id)
+        await websocket.send_json({"type": "session",
+                                   "session_id": session_id,
+                                   "total_questions": progress["total"]})
+
+        while not questionnaireService.is_questionnaire_complete(session_id):
+            await _ws_send_question(websocket, session_id)
+
+            # 等待回答；分析被拒（503）時請用戶端重送同一個回答
+            while True:
+                message = await _ws_receive_message(websocket)
+                answer = (message.get("answer")
+                          if isinstance(message, dict)
+                          and message.get("type") == "answer" else None)
+                if not isinstance(answer, str) or not answer.strip():
+                    await websocket.send_json({
+                        "type": "error", "code": 400,
+                        "detail": "請以文字訊息送出 {\"type\": \"answer\", "
+                                  "\"answer\": \"...\"}"})
+                    continue
+
+                question = questionnaireService.get_current_question(
+                    session_id)
+                if question is None:
+                    raise SessionExpired(session_id)
+                await websocket.send_json({"type": "progress",
+                                           "stage": "analyzing"})
+                try:
+                    sentiment_scores, stress_scores = (
+                        await analysisService.analyze_user_response_async(
+                            answer, question,
+                            questionnaireService.get_current_question_en(
+                                session_id)))
+                except AdmissionRejected as e:
+                    await websocket.send_json({
+                        "type": "error", "code": 503,
+                        "detail": "伺服器忙碌中，請稍後重送回答",
+                        "retry_after": e.retry_after})
+                    continue
+                break
+
+            if not questionnaireService.save_response(
+                    session_id, answer, sentiment_scores, stress_scores):
+                await websocket.send_json({"type": "error", "code": 400,
+                                           "detail": "儲存回答失敗"})
+                break
+
+            await websocket.send_json({
+                "type": "analysis",
+                "sentiment": sentiment_scores,
+                "partial_profile": questionnaireService.get_profile(
+                    session_id)
+            })
+
+        if questionnaireService.is_questionnaire_complete(session_id):
+            if questionnaireService.get_result(session_id) is None:
+                await websocket.send_json({"type": "progress",
+                                           "stage": "generating_advice"})
+            result = await _complete_questionnaire(session_id)
+            await websocket.send_json({"type": "result", **result})
+        await websocket.close()
+
+    except WebSocketDisconnect:
+        print("WebSocket 連線已中斷")
+    except asyncio.TimeoutError:
+        try:
+            await websocket.send_json({"type": "error", "code": 408,
+                                       "detail": "閒置逾時，連線已關閉"})
+            await websocket.close()
+        except Exception:
+            pass
+    except SessionExpired:
+        try:
+            await websocket.send_json({"type": "error", "code": 404,
+                                       "detail": "會話已過期，請重新開始"})
+            await websocket.close()
+        except Exception:
+            pass
+    except Exception as e:
+        print(f"WebSocket 問卷發生錯誤: {e}")
+        try:
+            await websocket.send_json({"type": "error", "code": 500,
+                                       "detail": "伺服器內部錯誤"})
+            await websocket.close()
+        except Exception:
+            pass
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 
 
 class StartResponse(BaseModel):
@@ -23,6 +23,8 @@ class NextQuestionResponse(BaseModel):
     # 新增：完成時後端回傳的分析檔案與類型
     profile: Optional[Dict[str, int]] = None
     investor_type: Optional[str] = None
+    # 作答中依目前回答累計的部分 profile
+    partial_profile: Optional[Dict[str, int]] = None
 
 
 class StreamQuestionRequest(BaseModel):
@@ -34,3 +36,22 @@ class SaveQuestionRequest(BaseModel):
     session_id: str
     question: str
     answer: str
+
+
+class QuestionAnswer(BaseModel):
+    question: str
+    answer: str
+
+
+class BulkAnswerRequest(BaseModel):
+    # 未提供 session_id 時會建立新會話
+    session_id: Optional[str] = None
+    answers: List[QuestionAnswer]
+
+
+class BulkAnswerResponse(BaseModel):
+    session_id: str
+    total_questions: int
+    advice: Optional[str] = None
+    profile: Optional[Dict[str, int]] = None
+    investor_type: Optional[str] = None
@@ -1,6 +1,7 @@
 # Services package
 
 from .analysis_service import AnalysisService
+from .export_service import ExportService
 from .gemini_service import GeminiService
 from .questionnaire_service import QuestionnaireService
 
@@ -8,3 +9,4 @@ from .questionnaire_service import QuestionnaireService
 analysisService = AnalysisService()
 geminiService = GeminiService()
 questionnaireService = QuestionnaireService()
+exportService = ExportService()
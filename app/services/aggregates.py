@@ -0,0 +1,104 @@
+from typing import Dict, Optional
+
+PROFILE_KEYS = ("risk", "stability", "confidence", "patience", "sensitivity")
+SENTIMENT_KEYS = ("negative", "neutral", "positive")
+
+
+def profile_delta(answer: str) -> Dict[str, float]:
+    """單一回答對五項指標的增減量（Likert 數值或文字關鍵字映射）"""
+    delta = {k: 0.0 for k in PROFILE_KEYS}
+    ans = (answer or "").strip()
+
+    # 先嘗試從 answer 抽出 Likert 數值（開頭數字或 "N — ..." 格式）
+    likert_val = None
+    try:
+        # 若格式為 "5 — 描述" 或 "5-描述"
+        if ans and (ans[0].isdigit()):
+            # 取首個數字
+            likert_val = int(ans[0])
+            if likert_val < 1 or likert_val > 5:
+                likert_val = None
+    except Exception:
+        likert_val = None
+
+    if likert_val is not None:
+        v = likert_val
+        delta["risk"] += (v - 3) * 8
+        delta["stability"] += (3 - v) * 6
+        delta["confidence"] += (v - 3) * 6
+        delta["patience"] += (v - 3) * 4
+        delta["sensitivity"] += (3 - v) * 6
+        return delta
+
+    # 非 Likert：以文字關鍵字映射
+    text = ans.lower()
+    if any(k in text for k in ["加碼", "買入", "進場", "冒險", "高風險"]):
+        delta["risk"] += 12
+        delta["confidence"] += 8
+        delta["sensitivity"] += 6
+    elif any(k in text for k in ["賣出", "逃離", "恐慌", "立刻賣出", "減碼"]):
+        delta["risk"] -= 12
+        delta["stability"] -= 8
+        delta["sensitivity"] += 10
+    elif any(k in text for k in ["觀望", "冷靜", "等待", "持有", "保守"]):
+        delta["stability"] += 10
+        delta["patience"] += 8
+        delta["risk"] -= 4
+    else:
+        # 長文字視為較高參與與信心
+        if len(text) > 80:
+            delta["confidence"] += 6
+            delta["patience"] += 4
+    return delta
+
+
+def finalize_profile(raw: Dict[str, float]) -> Dict[str, int]:
+    """clamp 0..100"""
+    def clamp(x): return max(0, min(100, round(x)))
+    return {k: clamp(raw[k]) for k in PROFILE_KEYS}
+
+
+def summary_line(index: int, question: str, answer: str,
+                 sentiment: Dict[str, float]) -> str:
+    """建議 prompt 中單題的問答與情緒摘要"""
+    return (
+        f"問題{index}: {question}\n回答: {answer}\n"
+        f"情緒 - 負面:{sentiment.get('negative', 0):.3f}, "
+        f"正面:{sentiment.get('positive', 0):.3f}\n"
+    )
+
+
+class RunningAggregate:
+    """
+    會話中的累計值，於每次儲存回答時更新：
+    profile 原始分數、情緒總和與筆數、預先組好的摘要行。
+    問卷完成時直接取用，不必再走訪全部回答。
+    """
+
+    def __init__(self):
+        self.profile_raw = {k: 50.0 for k in PROFILE_KEYS}
+        self.sentiment_sum = {k: 0.0 for k in SENTIMENT_KEYS}
+        self.count = 0
+        self.summary_lines = []
+
+    def add(self, question: Optional[str], answer: Optional[str],
+            sentiment: Dict[str, float]):
+        for key, value in profile_delta(answer).items():
+            self.profile_raw[key] += value
+        for key in SENTIMENT_KEYS:
+            self.sentiment_sum[key] += sentiment.get(key, 0)
+        self.count += 1
+        self.summary_lines.append(summary_line(
+            self.count, question or f"問題{self.count}",
+            answer or "無回答", sentiment))
+
+    def profile(self) -> Dict[str, int]:
+        return finalize_profile(self.profile_raw)
+
+    def sentiment_average(self) -> Dict[str, float]:
+        if self.count == 0:
+            return {k: 0.0 for k in SENTIMENT_KEYS}
+        return {k: v / self.count for k, v in self.sentiment_sum.items()}
+
+    def summary(self) -> str:
+        return "\n".join(self.summary_lines)
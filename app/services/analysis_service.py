@@ -1,11 +1,159 @@
 from typing import Dict, List
+from collections import OrderedDict
+import asyncio
+import json
+import threading
 from models import sentimentModel  # 移除 stressModel
-from config import ENABLE_CONTEXT_ANALYSIS
+from config import (ENABLE_CONTEXT_ANALYSIS, QUESTION_TRANSLATION_CACHE_SIZE,
+                    ANALYSIS_MAX_CONCURRENCY, ANALYSIS_MAX_QUEUE,
+                    ANALYSIS_QUEUE_TIMEOUT, RETRY_AFTER_SECONDS,
+                    CACHE_ENABLED, CACHE_DB_PATH, CACHE_MAX_ENTRIES)
+from utils.Admission import AdmissionLimiter, AdmissionRejected
+from utils.DiskCache import DiskCache
+from .aggregates import PROFILE_KEYS, profile_delta, finalize_profile
 
 
 class AnalysisService:
     def __init__(self):
-        pass
+        # 問題英譯快取：相同題目（例如 fallback 題目）只翻譯一次
+        self._question_en_cache: OrderedDict[str, str] = OrderedDict()
+        self._question_en_lock = threading.Lock()
+
+        # 模型推論的流量控制，佇列滿時拋出 AdmissionRejected
+        self.limiter = AdmissionLimiter(
+            "analysis", ANALYSIS_MAX_CONCURRENCY, ANALYSIS_MAX_QUEUE,
+            ANALYSIS_QUEUE_TIMEOUT, RETRY_AFTER_SECONDS)
+
+        # 情緒分數的持久快取（key：問題 + 回答，依模型版本失效）
+        self.sentiment_cache = (
+            DiskCache(CACHE_DB_PATH, "sentiment", sentimentModel.version,
+                      CACHE_MAX_ENTRIES)
+            if CACHE_ENABLED and sentimentModel.cacheable else None)
+
+    @staticmethod
+    def _cache_key(question: str, answer: str) -> str:
+        # 以 JSON 陣列組合，正規化空白時不會混淆問題與回答的邊界
+        return json.dumps([question, answer], ensure_ascii=False)
+
+    def translate_question(self, question: str) -> str:
+        """將問題翻譯為英文並快取，供 FinBERT 上下文分析使用"""
+        question = (question or "").strip()
+        # 免翻譯的後端（例如中文模型）不需要英文問題
+        if not question or not sentimentModel.needs_translation:
+            return ""
+
+        with self._question_en_lock:
+            cached = self._question_en_cache.get(question)
+            if cached is not None:
+                self._question_en_cache.move_to_end(question)
+                return cached
+
+        try:
+            question_en = sentimentModel.translator.translate_zn_en(question)
+        except Exception as e:
+            print(f"翻譯問題時發生錯誤: {e}")
+            return ""
+
+        with self._question_en_lock:
+            self._question_en_cache[question] = question_en
+            while (len(self._question_en_cache)
+                   > QUESTION_TRANSLATION_CACHE_SIZE):
+                self._question_en_cache.popitem(last=False)
+        return question_en
+
+    async def translate_question_async(self, question: str) -> str:
+        """
+        在執行緒中翻譯問題。流量過大時回傳空字串（降級），
+        分析回答時會再補翻譯。
+        """
+        if not question or not sentimentModel.needs_translation:
+            return ""
+        try:
+            return await self.limiter.run_in_thread(
+                self.translate_question, question)
+        except AdmissionRejected:
+            print("⚠️ 分析佇列已滿，問題英譯延後到分析時處理")
+            return ""
+
+    async def analyze_user_response_async(self, text: str, question: str = "",
+                                          question_en: str = "") -> (
+            tuple[Dict[str, float], Dict[str, float]]
+            ):
+        """
+        先查詢持久快取，命中時直接回傳、不佔用分析執行槽；
+        未命中才經流量控制在執行緒中推論。
+        佇列已滿或排隊逾時時拋出 AdmissionRejected。
+        """
+        cache_key = self._cache_key(self._context(question), text.strip())
+        if self.sentiment_cache:
+            cached = await asyncio.to_thread(self.sentiment_cache.get,
+                                             cache_key)
+            if cached is not None:
+                return cached, {}
+        return await self.limiter.run_in_thread(
+            self._analyze_uncached, text, question, question_en, cache_key)
+
+    async def analyze_batch_async(self, answers: List[str],
+                                  questions: List[str]) -> (
+            List[tuple[Dict[str, float], Dict[str, float]]]
+            ):
+        """
+        整批查詢快取，全部命中時不佔用執行槽；
+        未命中的部分只佔用一個執行槽，佇列已滿時拋出 AdmissionRejected。
+        """
+        texts, contexts, keys = self._prepare_batch(answers, questions)
+        scores = await asyncio.to_thread(self._lookup_many, keys)
+        if all(score is not None for score in scores):
+            print(f"📊 批次分析 {len(texts)} 筆回答（全部命中快取）")
+            return [(score, {}) for score in scores]
+        return await self.limiter.run_in_thread(
+            self._fill_missing, texts, contexts, keys, scores)
+
+    def analyze_batch(self, answers: List[str], questions: List[str]) -> (
+            List[tuple[Dict[str, float], Dict[str, float]]]
+            ):
+        """一次分析多筆（問題, 回答），回傳與輸入順序相同的（情緒, 壓力）列表"""
+        texts, contexts, keys = self._prepare_batch(answers, questions)
+        return self._fill_missing(texts, contexts, keys,
+                                  self._lookup_many(keys))
+
+    @staticmethod
+    def _context(question: str) -> str:
+        """啟用上下文分析時以問題作為上下文，否則為空字串"""
+        return (question or "").strip() if ENABLE_CONTEXT_ANALYSIS else ""
+
+    def _prepare_batch(self, answers: List[str], questions: List[str]):
+        texts = [a.strip() for a in answers]
+        contexts = [self._context(q) for q in questions]
+        keys = [self._cache_key(q, a) for q, a in zip(contexts, texts)]
+        return texts, contexts, keys
+
+    def _lookup_many(self, keys: List[str]) -> List:
+        return (self.sentiment_cache.get_many(keys) if self.sentiment_cache
+                else [None] * len(keys))
+
+    def _fill_missing(self, texts: List[str], contexts: List[str],
+                      keys: List[str], scores: List) -> (
+            List[tuple[Dict[str, float], Dict[str, float]]]
+            ):
+        """對快取未命中的項目執行推論並寫回快取"""
+        missing = [i for i, score in enumerate(scores) if score is None]
+        print(f"📊 批次分析 {len(texts)} 筆回答"
+              f"（快取命中 {len(texts) - len(missing)} 筆）")
+
+        if missing:
+            miss_contexts = [contexts[i] for i in missing]
+            miss_contexts_en = [self.translate_question(q)
+                                for q in miss_contexts]
+            raw_results = sentimentModel.analyze_batch(
+                [texts[i] for i in missing], miss_contexts, miss_contexts_en)
+            for i, raw in zip(missing, raw_results):
+                scores[i] = self.sanitize_sentiment_output(raw)
+            if self.sentiment_cache:
+                self.sentiment_cache.set_many((keys[i], scores[i])
+                                              for i in missing)
+
+        return [(score, {}) for score in scores]
 
     def sanitize_sentiment_output(self, raw) -> Dict[str, float]:
         """解析 SentimentModel 輸出，提取 negative、neutral、positive 分數"""
@@ -33,23 +181,50 @@ class AnalysisService:
             print(f"解析情緒輸出時發生錯誤: {e}")
         return result
 
-    def analyze_user_response(self, text: str, question: str = "") -> (
+    def analyze_user_response(self, text: str, question: str = "",
+                              question_en: str = "") -> (
             tuple[Dict[str, float], Dict[str, float]]
             ):
-        """分析使用者回應，回傳情緒與（空的）壓力分數以維持相容 API"""
+        """
+        分析使用者回應，回傳情緒與（空的）壓力分數以維持相容 API。
+        question_en 為會話中已儲存的英文問題，翻譯型後端只需翻譯回答。
+        """
+        cache_key = self._cache_key(self._context(question), text.strip())
+        sentiment_scores = (self.sentiment_cache.get(cache_key)
+                            if self.sentiment_cache else None)
+        if sentiment_scores is not None:
+            return sentiment_scores, {}
+        return self._analyze_uncached(text, question, question_en, cache_key)
+
+    def _analyze_uncached(self, text: str, question: str, question_en: str,
+                          cache_key: str) -> (
+            tuple[Dict[str, float], Dict[str, float]]
+            ):
+        """快取未命中時執行翻譯與情緒模型推論，並將結果寫回快取"""
+        analysis_text = text.strip()
+        question = question or ""
+        context = ""
         if ENABLE_CONTEXT_ANALYSIS and question.strip():
-            analysis_text = f"問題：{question.strip()} 回答：{text.strip()}"
-            print(f"📊 分析上下文: {analysis_text[:100]}...")
+            context = question.strip()
+            print(f"📊 分析上下文: {context[:50]} / "
+                  f"{analysis_text[:50]}...")
         else:
-            analysis_text = text.strip()
             if question:
                 print(f"⚠️ 有問題但未使用上下文分析: {question[:50]}...")
             print(f"📊 分析回答: {analysis_text[:50]}...")
 
-        # 只執行情緒分析（stressModel 已移除）
-        sentiment_raw = sentimentModel.analyze(analysis_text)
+        context_en = ""
+        if context:
+            context_en = question_en or self.translate_question(context)
 
+        # 只執行情緒分析（stressModel 已移除）
+        sentiment_raw = sentimentModel.analyze(analysis_text,
+                                               question=context,
+                                               question_en=context_en)
         sentiment_scores = self.sanitize_sentiment_output(sentiment_raw)
+        if self.sentiment_cache:
+            self.sentiment_cache.set(cache_key, sentiment_scores)
+
         stress_scores = {}  # 回傳空 dict 以保持呼叫端相容性
 
         print(f"🎭 情緒分析結果: {sentiment_scores}")
@@ -63,65 +238,13 @@ class AnalysisService:
         all_responses 為 questionnaire_service 存的 response_data 列表：
         每項通常包含 keys: question, answer, sentiment, stress
         回傳 risk, stability, confidence, patience, sensitivity（0-100）
+        會話中已有 RunningAggregate 時請改用 questionnaire_service.get_profile
         """
-        risk = 50
-        stability = 50
-        confidence = 50
-        patience = 50
-        sensitivity = 50
-
+        raw = {k: 50.0 for k in PROFILE_KEYS}
         for r in all_responses:
-            ans = (r.get("answer") or "").strip()
-            # 先嘗試從 answer 抽出 Likert 數值（開頭數字或 "N — ..." 格式）
-            likert_val = None
-            try:
-                # 若格式為 "5 — 描述" 或 "5-描述"
-                if ans and (ans[0].isdigit()):
-                    # 取首個數字
-                    likert_val = int(ans[0])
-                    if likert_val < 1 or likert_val > 5:
-                        likert_val = None
-            except Exception:
-                likert_val = None
-
-            if likert_val is not None:
-                v = likert_val
-                risk += (v - 3) * 8
-                stability += (3 - v) * 6
-                confidence += (v - 3) * 6
-                patience += (v - 3) * 4
-                sensitivity += (3 - v) * 6
-                continue
-
-            # 非 Likert：以文字關鍵字映射
-            text = ans.lower()
-            if any(k in text for k in ["加碼", "買入", "進場", "冒險", "高風險"]):
-                risk += 12
-                confidence += 8
-                sensitivity += 6
-            elif any(k in text for k in ["賣出", "逃離", "恐慌", "立刻賣出", "減碼"]):
-                risk -= 12
-                stability -= 8
-                sensitivity += 10
-            elif any(k in text for k in ["觀望", "冷靜", "等待", "持有", "保守"]):
-                stability += 10
-                patience += 8
-                risk -= 4
-            else:
-                # 長文字視為較高參與與信心
-                if len(text) > 80:
-                    confidence += 6
-                    patience += 4
-
-        # clamp 0..100
-        def clamp(x): return max(0, min(100, round(x)))
-        return {
-            "risk": clamp(risk),
-            "stability": clamp(stability),
-            "confidence": clamp(confidence),
-            "patience": clamp(patience),
-            "sensitivity": clamp(sensitivity),
-        }
+            for key, value in profile_delta(r.get("answer") or "").items():
+                raw[key] += value
+        return finalize_profile(raw)
 
     # 新增：依 profile 決定投資者類型
     def classify_investor(self, profile: Dict[str, int]) -> str:
@@ -0,0 +1,135 @@
+import json
+import os
+import queue
+import threading
+import time
+from typing import Dict, Optional
+from config import (EXPORT_ENABLED, EXPORT_DIR, EXPORT_QUEUE_SIZE,
+                    EXPORT_BATCH_SIZE, EXPORT_FLUSH_INTERVAL,
+                    EXPORT_MAX_FILE_RECORDS)
+
+
+class ExportService:
+    """
+    完成問卷的非同步批次匯出。
+    請求路徑只做一次 put_nowait；背景執行緒批次寫入輪替的 JSONL 檔。
+    佇列已滿時丟棄並計數（不阻塞請求），關閉時會先寫完佇列中的資料。
+    """
+
+    def __init__(self, export_dir: str = EXPORT_DIR,
+                 queue_size: int = EXPORT_QUEUE_SIZE,
+                 batch_size: int = EXPORT_BATCH_SIZE,
+                 flush_interval: float = EXPORT_FLUSH_INTERVAL,
+                 max_file_records: int = EXPORT_MAX_FILE_RECORDS,
+                 enabled: bool = EXPORT_ENABLED):
+        self.enabled = enabled
+        self.export_dir = export_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_file_records = max_file_records
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+        # 目前寫入中的檔案
+        self._file = None
+        self._file_records = 0
+        self._file_seq = 0
+
+        self.exported = 0
+        self.dropped = 0
+
+    def start(self):
+        """啟動背景寫入執行緒（重複呼叫無副作用）"""
+        if not self.enabled:
+            return
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            os.makedirs(self.export_dir, exist_ok=True)
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run,
+                                            name="session-export",
+                                            daemon=True)
+            self._thread.start()
+
+    def enqueue(self, record: Dict) -> bool:
+        """將完成的會話放入匯出佇列，佇列已滿時丟棄並回傳 False"""
+        if not self.enabled:
+            return False
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            print(f"⚠️ 匯出佇列已滿，已丟棄 {self.dropped} 筆會話")
+            return False
+
+    def close(self, timeout: float = 10.0):
+        """停止背景執行緒並寫完佇列中剩餘的資料"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            # 逾時仍在寫入：保留執行緒讓它寫完佇列並自行關檔，
+            # 不可在此關閉檔案，否則剩餘資料會寫入已關閉的檔案而遺失
+            print(f"⚠️ 匯出執行緒未在 {timeout:g} 秒內結束，"
+                  f"尚有 {self._queue.qsize()} 筆待寫入")
+            return
+        self._thread = None
+
+    def _run(self):
+        try:
+            self._drain()
+        finally:
+            # 檔案只由寫入執行緒開啟與關閉
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def _drain(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    print(f"匯出會話時發生錯誤: {e}")
+
+    def _open_next_file(self):
+        if self._file:
+            self._file.close()
+        self._file_seq += 1
+        # 檔名含 pid，多個 worker 同時寫入也不會衝突
+        name = (f"sessions-{time.strftime('%Y%m%d-%H%M%S')}"
+                f"-{os.getpid()}-{self._file_seq:04d}.jsonl")
+        self._file = open(os.path.join(self.export_dir, name), "a",
+                          encoding="utf-8")
+        self._file_records = 0
+
+    def _write_batch(self, batch):
+        for record in batch:
+            if self._file is None or self._file_records >= self.max_file_records:
+                self._open_next_file()
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file_records += 1
+        self._file.flush()
+        self.exported += len(batch)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize(),
+            "exported": self.exported,
+            "dropped": self.dropped,
+        }
@@ -1,6 +1,7 @@
 import asyncio
 import os
-from typing import List, Dict
+import time
+from typing import List, Dict, Optional
 import google.generativeai as genai
 from dotenv import load_dotenv
 from config import (
@@ -9,8 +10,23 @@ from config import (
     GEMINI_MAX_TOKENS,
     GEMINI_ADVICE_TEMPERATURE,
     GEMINI_ADVICE_MAX_TOKENS,
+    GEMINI_MAX_CONCURRENCY,
+    GEMINI_MAX_QUEUE,
+    GEMINI_QUEUE_TIMEOUT,
+    RETRY_AFTER_SECONDS,
+    GEMINI_QUESTION_DEADLINE,
+    GEMINI_ADVICE_DEADLINE,
+    GEMINI_HEDGE_ENABLED,
+    GEMINI_HEDGE_PERCENTILE,
+    GEMINI_HEDGE_BUDGET,
+    GEMINI_BREAKER_FAILURES,
+    GEMINI_BREAKER_COOLDOWN,
     STREAM_DELAY
 )
+from utils.Admission import AdmissionLimiter, AdmissionRejected
+from .aggregates import RunningAggregate
+from utils.Resilience import (CircuitBreaker, CircuitOpen, HedgeBudget,
+                              LatencyTracker, call_with_deadline)
 
 # 載入環境變數
 load_dotenv()
@@ -28,33 +44,146 @@ class GeminiService:
         else:
             print("警告：未設定 GOOGLE_API_KEY，將使用模擬回應")
 
+        # Gemini 呼叫的流量控制，佇列滿時改用 fallback
+        self.limiter = AdmissionLimiter(
+            "gemini", GEMINI_MAX_CONCURRENCY, GEMINI_MAX_QUEUE,
+            GEMINI_QUEUE_TIMEOUT, RETRY_AFTER_SECONDS)
+
+        # 逾時 / 錯誤過多時開啟斷路器，冷卻期間改用本地模板
+        self.breaker = CircuitBreaker("Gemini", GEMINI_BREAKER_FAILURES,
+                                      GEMINI_BREAKER_COOLDOWN)
+        # 問題生成的延遲分佈，用於決定 hedged 請求的送出時機
+        self.question_latency = LatencyTracker()
+        # hedged 請求的比例上限，避免上游變慢時負載加倍
+        self.hedge_budget = HedgeBudget(GEMINI_HEDGE_BUDGET)
+
+    async def _generate(self, prompt: str, generation_config,
+                        deadline: float,
+                        latency: LatencyTracker = None):
+        """
+        呼叫 Gemini 並套用韌性機制：
+        - 斷路器開啟時直接拋出 CircuitOpen
+        - 取得執行槽後的呼叫時間不超過 deadline，逾時拋出 TimeoutError；
+          本地排隊另受 GEMINI_QUEUE_TIMEOUT 限制（AdmissionRejected），
+          不會壓縮呼叫時間，也就不會因本地壅塞而誤開斷路器
+        - 提供 latency 時，超過其延遲百分位仍未完成則送出 hedged 請求；
+          hedged 請求同樣佔用執行槽，且受 hedge_budget 限制
+        - 每個送出的請求都佔用一個執行槽，直到執行緒真正結束才釋放
+        """
+        if not self.breaker.allow():
+            raise CircuitOpen("Gemini 斷路器開啟中")
+
+        model = genai.GenerativeModel(self.model_name)
+        hedge_after = None
+        if latency is not None and GEMINI_HEDGE_ENABLED:
+            hedge_after = latency.percentile(GEMINI_HEDGE_PERCENTILE)
+            self.hedge_budget.deposit()
+
+        def call():
+            # 執行緒無法從外部中斷，SDK 本身也要帶上剩餘時間作為逾時，
+            # 讓被放棄的請求（含 hedged 請求）在 deadline 後確實結束，
+            # 不會持續佔用預設 executor
+            remaining = max(1.0, deadline - (time.perf_counter() - start))
+            return model.generate_content(
+                prompt, generation_config=generation_config,
+                request_options={"timeout": remaining})
+
+        async def try_hedge() -> bool:
+            # 只在有空閒執行槽且仍有預算時送出，不為 hedged 請求排隊
+            if not self.hedge_budget.available():
+                return False
+            if not await self.limiter.try_acquire():
+                return False
+            self.hedge_budget.spend()
+            return True
+
+        settled = False
+        try:
+            await self.limiter.acquire()
+            # deadline 自取得執行槽起算
+            start = time.perf_counter()
+            try:
+                response = await call_with_deadline(
+                    call, deadline, hedge_after, try_hedge,
+                    on_thread_done=self.limiter.release)
+            except asyncio.TimeoutError:
+                # 逾時也計入延遲分佈，上游整體變慢時 hedging 門檻會跟著提高
+                if latency is not None:
+                    latency.record(time.perf_counter() - start)
+                raise
+            settled = True
+        except AdmissionRejected:
+            raise
+        except Exception:
+            settled = True
+            self.breaker.record_failure()
+            raise
+        finally:
+            # 本地排隊被拒或被取消（客戶端斷線、WebSocket 關閉）不代表
+            # Gemini 異常，不計成敗，但一定要釋放試探名額，
+            # 否則 half-open 狀態會永遠拒絕呼叫
+            if not settled:
+                self.breaker.release_trial()
+
+        self.breaker.record_success()
+        if latency is not None:
+            latency.record(time.perf_counter() - start)
+        return response
+
+    @staticmethod
+    def _question_type(current_number: int) -> str:
+        """題型輪替：1 情緒反應 (mc)，2 壓力感知 (likert)，3 風險偏好 (mc)，4 決策習慣 (mc 多選或開放)"""
+        qtype_cycle = (current_number - 1) % 4
+        if qtype_cycle == 0:
+            return "emotion_mc"     # 情緒反應，選項: 冷靜觀望 / 想立刻賣出 / 加碼買進
+        elif qtype_cycle == 1:
+            return "stress_likert"  # 壓力感知，Likert 1-5
+        elif qtype_cycle == 2:
+            return "risk_mc"        # 風險偏好，選項: 高風險高報酬 / 穩健中報酬 / 低風險低報酬
+        return "decision_mc"        # 決策習慣，多選或單選描述性選項
+
+    @staticmethod
+    def fallback_question(qtype: str, no_api_key: bool = False) -> str:
+        """
+        明確格式的 fallback 題目（包含選項或 Likert 指示）。
+        no_api_key 為未設定 API Key 時使用的版本，決策習慣題會提示可複選。
+        """
+        if qtype == "emotion_mc":
+            return "當股市短期暴跌 10% 時，您通常會怎麼做？ 冷靜觀望 / 想立刻賣出 / 加碼買進"
+        if qtype == "stress_likert":
+            return "在投資時，您多久會感到焦慮？請以 1 到 5 評分（1=從不，5=非常常）"
+        if qtype == "risk_mc":
+            return "您偏好哪種投資風格？ 高風險高報酬 / 穩健中報酬 / 低風險低報酬"
+        # decision habit
+        if no_api_key:
+            return "您通常如何做出投資決策？（可複選）列出常見做法，例如：分析公司基本面 / 聽從市場情緒 / 定期定額 / 朋友推薦"
+        return "您通常如何做出投資決策？ 分析公司基本面 / 聽從市場情緒 / 定期定額 / 朋友推薦"
+
+    @staticmethod
+    def fallback_advice() -> str:
+        return (
+            "根據您的回答，建議您：1) 建立規律的壓力管理習慣 "
+            "2) 尋求適當的社會支持 "
+            "3) 學習正向的情緒調節技巧 "
+            "4) 保持健康的生活作息"
+        )
+
     async def generate_dynamic_question(self, current_number: int,
                                         total_questions: int,
                                         previous_responses: List[Dict] = None
                                         ) -> str:
         """動態生成問題內容，並確保回傳能被前端辨識類型（MC / Likert / open）"""
-        # 題型輪替：1 情緒反應 (mc)，2 壓力感知 (likert)，3 風險偏好 (mc)，4 決策習慣 (mc 多選或開放)
-        # 使用輪替以保證問卷包含多種類型
-        qtype_cycle = (current_number - 1) % 4
-        if qtype_cycle == 0:
-            qtype = "emotion_mc"     # 情緒反應，選項: 冷靜觀望 / 想立刻賣出 / 加碼買進
-        elif qtype_cycle == 1:
-            qtype = "stress_likert"  # 壓力感知，Likert 1-5
-        elif qtype_cycle == 2:
-            qtype = "risk_mc"        # 風險偏好，選項: 高風險高報酬 / 穩健中報酬 / 低風險低報酬
-        else:
-            qtype = "decision_mc"    # 決策習慣，多選或單選描述性選項
+        # 使用題型輪替以保證問卷包含多種類型
+        qtype = self._question_type(current_number)
 
         # 如果沒有 API Key，回傳明確格式的 fallback 題目（包含選項或 Likert 指示）
         if not self.api_key:
-            if qtype == "emotion_mc":
-                return "當股市短期暴跌 10% 時，您通常會怎麼做？ 冷靜觀望 / 想立刻賣出 / 加碼買進"
-            if qtype == "stress_likert":
-                return "在投資時，您多久會感到焦慮？請以 1 到 5 評分（1=從不，5=非常常）"
-            if qtype == "risk_mc":
-                return "您偏好哪種投資風格？ 高風險高報酬 / 穩健中報酬 / 低風險低報酬"
-            # decision habit
-            return "您通常如何做出投資決策？（可複選）列出常見做法，例如：分析公司基本面 / 聽從市場情緒 / 定期定額 / 朋友推薦"
+            return self.fallback_question(qtype, no_api_key=True)
+
+        # 流量過大或斷路器開啟時直接使用 fallback 題目（降級模式）
+        if self.limiter.is_saturated() or self.breaker.state == "open":
+            print("⚠️ Gemini 忙碌或斷路器開啟，改用 fallback 題目")
+            return self.fallback_question(qtype)
 
         # 使用 Gemini 生成題目前，建立專用 prompt 強調輸出格式：
         if qtype == "emotion_mc":
@@ -92,13 +221,15 @@ class GeminiService:
         """
 
         try:
-            model = genai.GenerativeModel(self.model_name)
-            response = model.generate_content(
+            # SDK 為同步呼叫，於執行緒中執行並受 deadline 限制
+            response = await self._generate(
                 prompt,
-                generation_config=genai.GenerationConfig(
+                genai.GenerationConfig(
                     temperature=GEMINI_TEMPERATURE,
                     max_output_tokens=GEMINI_MAX_TOKENS,
-                )
+                ),
+                deadline=GEMINI_QUESTION_DEADLINE,
+                latency=self.question_latency
             )
 
             question = ""
@@ -152,14 +283,8 @@ class GeminiService:
 
         except Exception as e:
             print(f"動態問題生成錯誤: {e}")
-            # 發生錯誤時使用更明確的 fallback（包含類型提示）
-            if qtype == "emotion_mc":
-                return "當股市短期暴跌 10% 時，您通常會怎麼做？ 冷靜觀望 / 想立刻賣出 / 加碼買進"
-            if qtype == "stress_likert":
-                return "在投資時，您多久會感到焦慮？請以 1 到 5 評分（1=從不，5=非常常）"
-            if qtype == "risk_mc":
-                return "您偏好哪種投資風格？ 高風險高報酬 / 穩健中報酬 / 低風險低報酬"
-            return "您通常如何做出投資決策？ 分析公司基本面 / 聽從市場情緒 / 定期定額 / 朋友推薦"
+            # 發生錯誤（含佇列逾時）時使用更明確的 fallback（包含類型提示）
+            return self.fallback_question(qtype)
 
     async def stream_question_generation(self, current_number: int,
                                          total_questions: int,
@@ -180,42 +305,33 @@ class GeminiService:
         # 發送完成信號
         yield {"text": "", "done": True, "question": question_text}
 
-    async def generate_content(self, all_responses: List[Dict]) -> str:
-        """生成最終建議（移除壓力分數聚合，僅使用情緒與問答摘要）"""
+    async def generate_content(self, all_responses: List[Dict],
+                               aggregate: Optional[RunningAggregate] = None
+                               ) -> str:
+        """
+        生成最終建議（移除壓力分數聚合，僅使用情緒與問答摘要）。
+        提供會話的 aggregate 時直接使用累計的平均與摘要，不再走訪所有回答。
+        """
         if not self.api_key:
-            return (
-                "根據您的回答，建議您：1) 建立規律的壓力管理習慣 "
-                "2) 尋求適當的社會支持 "
-                "3) 學習正向的情緒調節技巧 "
-                "4) 保持健康的生活作息"
-            )
+            return self.fallback_advice()
 
-        # 構建分析摘要與情緒平均
-        summary_lines = []
-        total_negative = total_neutral = total_positive = 0.0
-        response_count = len(all_responses)
-
-        for i, response in enumerate(all_responses, 1):
-            sentiment = response.get("sentiment", {})
-            question = response.get("question", f"問題{i}")
-            answer = response.get("answer", "無回答")
-
-            total_negative += sentiment.get('negative', 0)
-            total_neutral += sentiment.get('neutral', 0)
-            total_positive += sentiment.get('positive', 0)
-
-            summary_lines.append(
-                f"問題{i}: {question}\n回答: {answer}\n"
-                f"情緒 - 負面:{sentiment.get('negative', 0):.3f}, "
-                f"正面:{sentiment.get('positive', 0):.3f}\n"
-            )
+        # 流量過大或斷路器開啟時直接使用 fallback 建議（降級模式）
+        if self.limiter.is_saturated() or self.breaker.state == "open":
+            print("⚠️ Gemini 忙碌或斷路器開啟，改用 fallback 建議")
+            return self.fallback_advice()
 
-        if response_count > 0:
-            avg_negative = total_negative / response_count
-            avg_neutral = total_neutral / response_count
-            avg_positive = total_positive / response_count
-        else:
-            avg_negative = avg_neutral = avg_positive = 0.0
+        # 構建分析摘要與情緒平均
+        if aggregate is None:
+            aggregate = RunningAggregate()
+            for response in all_responses:
+                aggregate.add(response.get("question"),
+                              response.get("answer"),
+                              response.get("sentiment", {}))
+        response_count = aggregate.count
+        averages = aggregate.sentiment_average()
+        avg_negative = averages["negative"]
+        avg_neutral = averages["neutral"]
+        avg_positive = averages["positive"]
 
         prompt = f"""
 請根據以下使用者在心理問卷中的情緒分析結果，提供個人化的心理健康建議：
@@ -226,7 +342,7 @@ class GeminiService:
 - 平均正面情緒: {avg_positive:.3f}
 
 詳細問答與分析：
-{chr(10).join(summary_lines)}
+{aggregate.summary()}
 
 請提供：
 1. 心理狀態整體分析（基於平均分數）
@@ -241,13 +357,13 @@ class GeminiService:
         print("=" * 50)
 
         try:
-            model = genai.GenerativeModel(self.model_name)
-            response = model.generate_content(
+            response = await self._generate(
                 prompt,
-                generation_config=genai.GenerationConfig(
+                genai.GenerationConfig(
                     temperature=GEMINI_ADVICE_TEMPERATURE,
                     max_output_tokens=GEMINI_ADVICE_MAX_TOKENS,
-                )
+                ),
+                deadline=GEMINI_ADVICE_DEADLINE
             )
 
             if getattr(response, "text", None):
@@ -255,6 +371,9 @@ class GeminiService:
                 return clean_advice.strip()
             else:
                 return "(系統暫時無法生成回應，請稍後再試)"
+        except (AdmissionRejected, CircuitOpen, asyncio.TimeoutError) as e:
+            print(f"⚠️ Gemini 無法及時回應（{type(e).__name__}），改用 fallback 建議")
+            return self.fallback_advice()
         except Exception as e:
             print(f"Gemini API 錯誤: {e}")
             if "quota" in str(e).lower():
@@ -1,18 +1,51 @@
 from typing import Dict, List, Optional
+from collections import OrderedDict
+import time
 import uuid
 import threading
-from config import TOTAL_QUESTIONS
+from config import TOTAL_QUESTIONS, SESSION_MAX_COUNT, SESSION_TTL_SECONDS
+from .aggregates import RunningAggregate
+
+
+class SessionExpired(LookupError):
+    """會話不存在或已因閒置 / 數量上限被淘汰"""
 
 
 class QuestionnaireService:
-    def __init__(self):
-        # 會話管理
-        self.sessions: Dict[str, Dict] = {}
+    def __init__(self, max_sessions: int = SESSION_MAX_COUNT,
+                 session_ttl: float = SESSION_TTL_SECONDS):
+        # 會話管理（依最近使用時間排序，最舊的在最前面）
+        self.sessions: OrderedDict[str, Dict] = OrderedDict()
         self.sessions_lock = threading.Lock()
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
 
         # 問題設定
         self.total_questions = TOTAL_QUESTIONS
 
+    def _evict_sessions(self):
+        """淘汰閒置逾時與超出數量上限的會話（需持有 sessions_lock）"""
+        now = time.monotonic()
+        while self.sessions:
+            oldest = next(iter(self.sessions.values()))
+            expired = now - oldest["last_access"] > self.session_ttl
+            if not expired and len(self.sessions) <= self.max_sessions:
+                break
+            self.sessions.popitem(last=False)
+
+    def _touch(self, session_id: str) -> Dict:
+        """
+        更新最近使用時間並移到最後（需持有 sessions_lock）。
+        讀取與寫入都需呼叫，_evict_sessions 才不會淘汰作答中的會話；
+        會話已不存在時拋出 SessionExpired。
+        """
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise SessionExpired(session_id)
+        session["last_access"] = time.monotonic()
+        self.sessions.move_to_end(session_id)
+        return session
+
     def create_session(self) -> str:
         """建立新的會話"""
         session_id = str(uuid.uuid4())
@@ -20,14 +53,21 @@ class QuestionnaireService:
             self.sessions[session_id] = {
                 "current_question": 0,
                 "responses": [],
-                "questions": []  # 儲存動態生成的問題
+                "questions": [],  # 儲存動態生成的問題
+                "questions_en": [],  # 問題的英文譯文（供情緒分析使用）
+                "aggregate": RunningAggregate(),  # profile / 情緒 / 摘要累計值
+                "last_access": time.monotonic()
             }
+            self._evict_sessions()
         return session_id
 
     def get_session(self, session_id: str) -> Optional[Dict]:
-        """取得會話資料"""
+        """取得會話資料（並更新最近使用時間）"""
         with self.sessions_lock:
-            return self.sessions.get(session_id)
+            try:
+                return self._touch(session_id)
+            except SessionExpired:
+                return None
 
     def get_current_question(self, session_id: str) -> Optional[str]:
         """取得當前問題（如果已生成）"""
@@ -45,22 +85,37 @@ class QuestionnaireService:
         # 如果問題還沒生成，返回 None（需要動態生成）
         return None
 
-    def save_generated_question(self, session_id: str, question: str) -> bool:
-        """儲存動態生成的問題"""
+    def get_current_question_en(self, session_id: str) -> str:
+        """取得當前問題的英文譯文（若尚未儲存則回傳空字串）"""
+        session = self.get_session(session_id)
+        if not session:
+            return ""
+
+        current_index = session["current_question"]
+        questions_en = session.get("questions_en", [])
+        if current_index < len(questions_en):
+            return questions_en[current_index]
+        return ""
+
+    def save_generated_question(self, session_id: str, question: str,
+                                question_en: str = "") -> bool:
+        """儲存動態生成的問題（與其英文譯文），會話已淘汰時拋出 SessionExpired"""
         with self.sessions_lock:
-            session = self.sessions.get(session_id)
-            if not session:
-                return False
+            session = self._touch(session_id)
 
             current_index = session["current_question"]
             questions = session["questions"]
+            questions_en = session.setdefault("questions_en", [])
 
             # 確保 questions 列表足夠長，填充空位置
             while len(questions) <= current_index:
                 questions.append("")
+            while len(questions_en) <= current_index:
+                questions_en.append("")
 
             # 在正確的索引位置儲存問題
             questions[current_index] = question
+            questions_en[current_index] = question_en
             # print(f"🔍 儲存問題到索引 {current_index}: {question[:50]}...")
 
             return True
@@ -68,11 +123,9 @@ class QuestionnaireService:
     def save_response(self, session_id: str, answer: str,
                       sentiment_scores: Dict[str, float],
                       stress_scores: Dict[str, float]) -> bool:
-        """儲存回答"""
+        """儲存回答，會話已淘汰時拋出 SessionExpired"""
         with self.sessions_lock:
-            session = self.sessions.get(session_id)
-            if not session:
-                return False
+            session = self._touch(session_id)
 
             current_index = session["current_question"]
             questions = session.get("questions", [])
@@ -92,18 +145,55 @@ class QuestionnaireService:
                 "stress": stress_scores
             }
             session["responses"].append(response_data)
+            session["aggregate"].add(response_data["question"], answer,
+                                     sentiment_scores)
 
             # 移動到下一個問題
             session["current_question"] += 1
 
             return True
 
+    def save_bulk_responses(self, session_id: str,
+                            responses: List[Dict]) -> bool:
+        """
+        一次寫入整份問卷的回答（bulk 提交），取代會話中既有的問答。
+        responses 每項包含 question、answer、sentiment、stress；
+        question_en 可省略（bulk 會話寫入後即已完成，不會再用到英文問題）。
+        會話已淘汰時拋出 SessionExpired。
+        """
+        with self.sessions_lock:
+            session = self._touch(session_id)
+
+            session["questions"] = [r["question"] for r in responses]
+            session["questions_en"] = [r.get("question_en", "")
+                                       for r in responses]
+            session["responses"] = [
+                {
+                    "question": r["question"],
+                    "answer": r["answer"],
+                    "sentiment": r["sentiment"],
+                    "stress": r["stress"]
+                }
+                for r in responses
+            ]
+            aggregate = RunningAggregate()
+            for r in responses:
+                aggregate.add(r["question"], r["answer"], r["sentiment"])
+            session["aggregate"] = aggregate
+            session["current_question"] = len(responses)
+            # bulk 提交的題數即為此會話的總題數
+            session["total_questions"] = len(responses)
+            # 回答整批替換，先前保存的完成結果已不適用
+            session.pop("result", None)
+            return True
+
     def is_questionnaire_complete(self, session_id: str) -> bool:
         """檢查問卷是否完成"""
         session = self.get_session(session_id)
         if not session:
             return False
-        return session["current_question"] >= self.total_questions
+        return session["current_question"] >= session.get(
+            "total_questions", self.total_questions)
 
     def get_all_responses(self, session_id: str) -> List[Dict]:
         """取得所有回答"""
@@ -112,6 +202,36 @@ class QuestionnaireService:
             return []
         return session["responses"]
 
+    def save_result(self, session_id: str, result: Dict) -> bool:
+        """保存問卷完成結果（建議、profile、分類），之後接續會話時直接回傳"""
+        session = self.get_session(session_id)
+        if not session:
+            return False
+        session["result"] = result
+        return True
+
+    def get_result(self, session_id: str) -> Optional[Dict]:
+        """取得已完成問卷的結果，尚未完成時回傳 None"""
+        session = self.get_session(session_id)
+        if not session:
+            return None
+        return session.get("result")
+
+    def get_aggregate(self, session_id: str) -> Optional[RunningAggregate]:
+        """取得會話的累計值（profile 原始分數、情緒總和、摘要）"""
+        session = self.get_session(session_id)
+        if not session:
+            return None
+        return session["aggregate"]
+
+    def get_profile(self, session_id: str) -> Optional[Dict[str, int]]:
+        """由累計值取得目前的 profile（作答中即為部分 profile），O(1)"""
+        aggregate = self.get_aggregate(session_id)
+        if aggregate is None:
+            return None
+        with self.sessions_lock:
+            return aggregate.profile()
+
     def get_progress(self, session_id: str) -> Dict[str, int]:
         """取得進度資訊"""
         session = self.get_session(session_id)
@@ -119,7 +239,7 @@ class QuestionnaireService:
             return {"current": 0, "total": self.total_questions}
         return {
             "current": session["current_question"],
-            "total": self.total_questions
+            "total": session.get("total_questions", self.total_questions)
         }
 
     def delete_session(self, session_id: str) -> bool:
@@ -0,0 +1 @@
+# Tools package（離線工具，於 app 目錄下以 python -m tools.<name> 執行）
@@ -0,0 +1,158 @@
+"""
+離線比較情緒分析後端的標籤一致性與延遲。
+
+用法（於 app 目錄下執行）：
+    python -m tools.evaluate_sentiment_backends
+    python -m tools.evaluate_sentiment_backends --backends finbert chinese \\
+        --samples samples.jsonl --repeat 3
+
+samples.jsonl 每行一筆 {"question": "...", "answer": "...", "label": "..."}，
+label（negative / neutral / positive）可省略。第一個後端視為基準，
+其餘後端皆與它比較標籤一致率。
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from typing import Dict, List
+
+# 只建立此工具指定的後端，避免 models 套件初始化時多載入一份預設模型
+os.environ.setdefault("SENTIMENT_BACKEND", "stub")
+# 關閉持久快取，否則重複量測（含先前執行過的樣本）量到的是 SQLite 查詢而非模型
+os.environ["CACHE_ENABLED"] = "0"
+
+from models.SentimentBackends import create_backend  # noqa: E402
+from utils.Metrics import percentile  # noqa: E402
+
+
+DEFAULT_SAMPLES = [
+    {"question": "當股市短期暴跌 10% 時，您通常會怎麼做？ 冷靜觀望 / 想立刻賣出 / 加碼買進",
+     "answer": "冷靜觀望"},
+    {"question": "當股市短期暴跌 10% 時，您通常會怎麼做？ 冷靜觀望 / 想立刻賣出 / 加碼買進",
+     "answer": "想立刻賣出，我很怕繼續虧損"},
+    {"question": "當股市短期暴跌 10% 時，您通常會怎麼做？ 冷靜觀望 / 想立刻賣出 / 加碼買進",
+     "answer": "加碼買進，這是難得的好機會"},
+    {"question": "在投資時，您多久會感到焦慮？請以 1 到 5 評分（1=從不，5=非常常）",
+     "answer": "5 — 幾乎每天都很焦慮"},
+    {"question": "在投資時，您多久會感到焦慮？請以 1 到 5 評分（1=從不，5=非常常）",
+     "answer": "1 — 從不"},
+    {"question": "您偏好哪種投資風格？ 高風險高報酬 / 穩健中報酬 / 低風險低報酬",
+     "answer": "高風險高報酬"},
+    {"question": "您偏好哪種投資風格？ 高風險高報酬 / 穩健中報酬 / 低風險低報酬",
+     "answer": "低風險低報酬，我不想承擔損失"},
+    {"question": "您通常如何做出投資決策？ 分析公司基本面 / 聽從市場情緒 / 定期定額 / 朋友推薦",
+     "answer": "分析公司基本面，並定期定額長期持有"},
+    {"question": "您通常如何做出投資決策？ 分析公司基本面 / 聽從市場情緒 / 定期定額 / 朋友推薦",
+     "answer": "聽朋友推薦，結果常常賠錢"},
+]
+
+
+def load_samples(path: str) -> List[Dict]:
+    samples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                samples.append(json.loads(line))
+    return samples
+
+
+def top_label(raw) -> str:
+    """取 pipeline 輸出中分數最高的標籤並正規化為 negative/neutral/positive"""
+    items = raw[0] if raw and isinstance(raw[0], list) else raw
+    best = max(items, key=lambda item: float(item.get("score", 0.0)))
+    label = best.get("label", "").lower()
+    if "neg" in label:
+        return "negative"
+    if "pos" in label:
+        return "positive"
+    return "neutral"
+
+
+def evaluate(backend_name: str, samples: List[Dict], repeat: int) -> Dict:
+    print(f"載入後端 {backend_name} ...")
+    start = time.perf_counter()
+    backend = create_backend(backend_name)
+    load_time = time.perf_counter() - start
+
+    answers = [s["answer"] for s in samples]
+    questions = [s.get("question", "") for s in samples]
+    # 正式流程中問題的英文譯文在生成題目時就已保存，量測時同樣先翻譯好，
+    # 只計入回答的翻譯與情緒分析
+    questions_en = None
+    if backend.needs_translation and backend.translator:
+        unique = list(dict.fromkeys(q for q in questions if q))
+        translated = dict(zip(unique,
+                              backend.translator.translate_batch(unique)))
+        questions_en = [translated.get(q, "") for q in questions]
+
+    # 暖機一次，避免把 lazy 初始化算進延遲
+    backend.analyze_batch(answers[:1], questions[:1],
+                          questions_en[:1] if questions_en else None)
+
+    latencies = []
+    labels: List[str] = []
+    for _ in range(repeat):
+        labels = []
+        for i, (answer, question) in enumerate(zip(answers, questions)):
+            t0 = time.perf_counter()
+            raw = backend.analyze_batch(
+                [answer], [question],
+                [questions_en[i]] if questions_en else None)[0]
+            latencies.append((time.perf_counter() - t0) * 1000)
+            labels.append(top_label(raw))
+
+    t0 = time.perf_counter()
+    backend.analyze_batch(answers, questions, questions_en)
+    batch_time = (time.perf_counter() - t0) * 1000
+
+    return {
+        "backend": backend_name,
+        "model": backend.model_name,
+        "load_s": load_time,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": percentile(latencies, 0.95),
+        "batch_ms": batch_time,
+        "labels": labels,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較情緒分析後端")
+    parser.add_argument("--backends", nargs="+",
+                        default=["finbert", "chinese"],
+                        help="要比較的後端，第一個為基準")
+    parser.add_argument("--samples", help="JSONL 樣本檔（預設使用內建樣本）")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="逐筆延遲量測的重複次數")
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples) if args.samples else DEFAULT_SAMPLES
+    results = [evaluate(name, samples, args.repeat) for name in args.backends]
+    baseline = results[0]
+    gold = [s.get("label") for s in samples]
+
+    print()
+    print(f"樣本數: {len(samples)}，基準後端: {baseline['backend']}")
+    header = (f"{'backend':<10} {'load(s)':>8} {'p50(ms)':>9} {'p95(ms)':>9} "
+              f"{'batch(ms)':>10} {'agree':>7} {'gold':>7}")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        agree = sum(a == b for a, b in zip(r["labels"], baseline["labels"]))
+        labeled = [(p, g) for p, g in zip(r["labels"], gold) if g]
+        gold_acc = (f"{sum(p == g.lower() for p, g in labeled) / len(labeled):.0%}"
+                    if labeled else "-")
+        print(f"{r['backend']:<10} {r['load_s']:>8.2f} {r['p50_ms']:>9.1f} "
+              f"{r['p95_ms']:>9.1f} {r['batch_ms']:>10.1f} "
+              f"{agree / len(samples):>7.0%} {gold_acc:>7}")
+
+    print()
+    for i, sample in enumerate(samples):
+        row = " / ".join(f"{r['backend']}={r['labels'][i]}" for r in results)
+        print(f"{sample['answer'][:20]:<20} {row}")
+
+
+if __name__ == "__main__":
+    main()
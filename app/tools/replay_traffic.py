@@ -0,0 +1,173 @@
+"""
+重播錄製的流量並回報吞吐量、錯誤率與延遲百分位。
+
+錄製：啟動服務前設定 TRAFFIC_RECORD_PATH=traffic.jsonl。
+重播（於 app 目錄下執行，需安裝 httpx）：
+    # 於行程內直接驅動 ASGI app（預設 stub Gemini + stub 情緒分析，不匯出會話）
+    python -m tools.replay_traffic traffic.jsonl --speed 2
+    # 使用真實模型（仍使用 stub Gemini）
+    python -m tools.replay_traffic traffic.jsonl --real-models
+    # 對已啟動的服務重播（服務端需自行以 GOOGLE_API_KEY= 啟動才會是 stub Gemini）
+    python -m tools.replay_traffic traffic.jsonl --base-url http://localhost:8081
+
+每個錄製的會話依原本的相對時間（除以 --speed）依序送出請求，
+不同會話之間則依時間軸交錯並行，重現真實的會話穿插情況。
+錄製開始前已建立的會話（沒有 /start 紀錄）會被略過。
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from utils.Metrics import percentile
+
+
+def load_events(path: str) -> Dict[str, List[Dict]]:
+    """讀取錄製檔並依匿名會話分組（保持時間順序）"""
+    sessions: Dict[str, List[Dict]] = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            event = json.loads(line)
+            if event.get("session"):
+                sessions[event["session"]].append(event)
+    # 以第一筆請求為時間零點，略過錄製開始前的空檔
+    t0 = min((e["t"] for events in sessions.values() for e in events),
+             default=0)
+    for events in sessions.values():
+        for event in events:
+            event["t"] -= t0
+        events.sort(key=lambda e: e["t"])
+    return sessions
+
+
+class Replayer:
+    def __init__(self, client, speed: float):
+        self.client = client
+        self.speed = speed
+        self.results: Dict[str, List] = defaultdict(list)
+        self.skipped = 0
+
+    async def _send(self, event: Dict, session_id: str):
+        endpoint = event["endpoint"]
+        if endpoint == "/questionnaire/start":
+            body = None
+        elif endpoint == "/questionnaire/stream-question":
+            body = {"session_id": session_id}
+        elif endpoint == "/questionnaire/save-question":
+            body = {"session_id": session_id, "question": "",
+                    "answer": event.get("answer") or ""}
+        else:
+            body = {"session_id": session_id,
+                    "answer": event.get("answer") or ""}
+
+        start = time.perf_counter()
+        try:
+            response = await self.client.post(endpoint, json=body)
+            # 串流端點需讀完整個回應才算完成
+            await response.aread()
+            status = response.status_code
+        except Exception as e:
+            print(f"⚠️ {endpoint} 請求失敗: {e}")
+            response, status = None, 0
+        self.results[endpoint].append((time.perf_counter() - start, status))
+        return response
+
+    async def replay_session(self, events: List[Dict], origin: float):
+        if events[0]["endpoint"] != "/questionnaire/start":
+            self.skipped += 1
+            return
+
+        session_id = None
+        loop = asyncio.get_running_loop()
+        for event in events:
+            delay = origin + event["t"] / self.speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            response = await self._send(event, session_id)
+            if event["endpoint"] == "/questionnaire/start":
+                if response is None or response.status_code != 200:
+                    return  # 無法建立會話，後續請求無意義
+                session_id = response.json()["session_id"]
+
+    def report(self, wall_time: float):
+        all_results = [r for rs in self.results.values() for r in rs]
+        if not all_results:
+            print("沒有可重播的請求")
+            return
+
+        def row(name, results):
+            latencies = [lat * 1000 for lat, _ in results]
+            errors = sum(1 for _, status in results
+                         if status == 0 or status >= 400)
+            print(f"{name:<32} {len(results):>6} {errors / len(results):>7.1%} "
+                  f"{statistics.median(latencies):>8.1f} "
+                  f"{percentile(latencies, 0.95):>8.1f} "
+                  f"{percentile(latencies, 0.99):>8.1f}")
+
+        print()
+        print(f"總請求數: {len(all_results)}，耗時 {wall_time:.1f}s，"
+              f"吞吐量 {len(all_results) / wall_time:.1f} req/s，"
+              f"略過會話 {self.skipped}")
+        print(f"{'endpoint':<32} {'count':>6} {'errors':>7} "
+              f"{'p50(ms)':>8} {'p95(ms)':>8} {'p99(ms)':>8}")
+        for endpoint in sorted(self.results):
+            row(endpoint, self.results[endpoint])
+        row("ALL", all_results)
+
+
+async def run(args):
+    import httpx
+
+    sessions = load_events(args.recording)
+    print(f"載入 {len(sessions)} 個會話，重播速度 {args.speed}x")
+
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=60)
+    else:
+        from main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                   base_url="http://replay", timeout=60)
+
+    replayer = Replayer(client, args.speed)
+    loop = asyncio.get_running_loop()
+    origin = loop.time()
+    async with client:
+        await asyncio.gather(*(replayer.replay_session(events, origin)
+                               for events in sessions.values()))
+    replayer.report(loop.time() - origin)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="重播錄製的流量")
+    parser.add_argument("recording", help="TRAFFIC_RECORD_PATH 錄製的 JSONL")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="重播倍速（2 = 兩倍速）")
+    parser.add_argument("--base-url",
+                        help="對已啟動的服務重播；省略時於行程內驅動 ASGI app")
+    parser.add_argument("--real-models", action="store_true",
+                        help="行程內重播時載入真實情緒分析模型")
+    args = parser.parse_args()
+
+    if not args.base_url:
+        # 行程內重播一律使用 stub Gemini（fallback 題目與建議）
+        os.environ["GOOGLE_API_KEY"] = ""
+        os.environ.pop("TRAFFIC_RECORD_PATH", None)
+        # 重播的合成會話不可寫入分析用的 exports/；
+        # ASGITransport 也不會觸發 shutdown，背景匯出無法正常收尾
+        os.environ["EXPORT_ENABLED"] = "0"
+        if not args.real_models:
+            os.environ["SENTIMENT_BACKEND"] = "stub"
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
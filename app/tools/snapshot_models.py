@@ -0,0 +1,205 @@
+"""
+建立模型快照並量測冷啟動時間與記憶體。
+
+用法（於 app 目錄下執行）：
+    # 將 FinBERT、中文情緒模型與 MarianMT 翻譯模型存成 safetensors 快照
+    python -m tools.snapshot_models save
+    python -m tools.snapshot_models save --models ProsusAI/finbert
+
+    # 比較 Hugging Face 快取載入與快照 mmap 載入的冷啟動時間與 RSS
+    python -m tools.snapshot_models bench --workers 2
+
+    # 確認翻譯模型從快照載入與從 Hugging Face 載入的譯文一致
+    python -m tools.snapshot_models verify
+
+快照存放於 config.MODEL_SNAPSHOT_DIR（可用環境變數 MODEL_SNAPSHOT_DIR 覆寫），
+服務啟動時 utils.ModelLoader 會自動優先使用快照。
+注意：權重共用只在 CPU 推論（MODEL_DEVICE = -1）時成立，
+移到 GPU 時權重會被複製到顯示記憶體。
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from config import (FINBERT_MODEL_NAME, CHINESE_SENTIMENT_MODEL_NAME,
+                    TRANSLATOR_ZH_EN_MODEL, TRANSLATOR_EN_ZH_MODEL,
+                    MODEL_SNAPSHOT_DIR)
+from utils.Metrics import read_proc_status
+
+# 回報的記憶體欄位（KB），RssFile 為可跨行程共用的檔案頁面
+MEMORY_FIELDS = ("VmRSS", "RssAnon", "RssFile", "VmHWM")
+
+# 模型名稱 -> transformers Auto 類別名稱
+MODEL_CLASSES = {
+    FINBERT_MODEL_NAME: "AutoModelForSequenceClassification",
+    CHINESE_SENTIMENT_MODEL_NAME: "AutoModelForSequenceClassification",
+    TRANSLATOR_ZH_EN_MODEL: "AutoModelForSeq2SeqLM",
+    TRANSLATOR_EN_ZH_MODEL: "AutoModelForSeq2SeqLM",
+}
+
+
+# 快照一致性檢查用的例句（涵蓋短句與接近問卷回答長度的句子）
+VERIFY_SAMPLES = {
+    TRANSLATOR_ZH_EN_MODEL: [
+        "我願意承擔較高的風險以換取更高的報酬。",
+        "市場大跌時我通常會先觀望，等情況明朗之後再決定是否加碼，"
+        "因為我不希望在恐慌中做出衝動的決定。",
+    ],
+    TRANSLATOR_EN_ZH_MODEL: [
+        "I prefer stable returns over high risk.",
+        "When the market drops sharply, I usually wait and see before "
+        "deciding whether to buy more, because I do not want to act on panic.",
+    ],
+}
+
+
+def _model_class(model_name: str):
+    import transformers
+    return getattr(transformers, MODEL_CLASSES[model_name])
+
+
+def verify_translation(model_name: str) -> bool:
+    """比對 Hugging Face 模型與快照模型的譯文，兩者應完全相同"""
+    from transformers import pipeline
+    from utils.ModelLoader import has_snapshot, load_snapshot, load_tokenizer
+    if not has_snapshot(model_name):
+        print(f"⚠️ {model_name} 尚無快照，略過一致性檢查")
+        return False
+    model_cls = _model_class(model_name)
+    hub = pipeline("translation",
+                   model=model_cls.from_pretrained(model_name),
+                   tokenizer=model_name)
+    # 直接載入快照（不退回 hub），快照不符時以 SnapshotMismatch 失敗
+    snapshot = pipeline("translation",
+                        model=load_snapshot(model_cls, model_name),
+                        tokenizer=load_tokenizer(model_name))
+    samples = VERIFY_SAMPLES[model_name]
+    ok = True
+    for text, a, b in zip(samples, hub(samples), snapshot(samples)):
+        if a["translation_text"] != b["translation_text"]:
+            ok = False
+            print(f"❌ {model_name} 譯文不一致: {text}")
+            print(f"   hub:      {a['translation_text']}")
+            print(f"   snapshot: {b['translation_text']}")
+    if ok:
+        print(f"✅ {model_name} 快照譯文與 Hugging Face 一致")
+    return ok
+
+
+def cmd_save(args):
+    from utils.ModelLoader import save_snapshot
+    for model_name in args.models:
+        start = time.perf_counter()
+        path = save_snapshot(_model_class(model_name), model_name,
+                             args.snapshot_dir)
+        print(f"✅ {model_name} -> {path} "
+              f"({time.perf_counter() - start:.1f}s)")
+    _verify_all(args.models)
+
+
+def _verify_all(models) -> None:
+    """對翻譯模型執行快照一致性檢查，有不一致時以非零狀態結束"""
+    results = [verify_translation(m) for m in models
+               if m in VERIFY_SAMPLES]
+    if not all(results):
+        raise SystemExit(1)
+
+
+def cmd_verify(args):
+    _verify_all(args.models)
+
+
+def cmd_load(args):
+    """在獨立行程中載入單一模型並以 JSON 回報（供 bench 呼叫）"""
+    start = time.perf_counter()
+    import transformers  # noqa: F401  計入匯入時間
+    import_time = time.perf_counter() - start
+
+    model_cls = _model_class(args.model)
+    start = time.perf_counter()
+    if args.mode == "snapshot":
+        from utils.ModelLoader import has_snapshot, load_snapshot
+        if not has_snapshot(args.model):
+            raise SystemExit(f"找不到 {args.model} 的快照，請先執行 save")
+        load_snapshot(model_cls, args.model)
+    else:
+        model_cls.from_pretrained(args.model)
+    load_time = time.perf_counter() - start
+
+    print(json.dumps({"import_s": import_time, "load_s": load_time,
+                      **read_proc_status(MEMORY_FIELDS)}))
+    if args.hold:
+        # 讓多個 worker 同時存活，以觀察共用頁面
+        time.sleep(args.hold)
+
+
+def _run_workers(model_name: str, mode: str, workers: int) -> list:
+    cmd = [sys.executable, "-m", "tools.snapshot_models", "_load",
+           "--model", model_name, "--mode", mode, "--hold", "3"]
+    procs = [subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+             for _ in range(workers)]
+    results = []
+    for proc in procs:
+        out, _ = proc.communicate()
+        lines = [line for line in out.splitlines() if line.startswith("{")]
+        if proc.returncode == 0 and lines:
+            results.append(json.loads(lines[-1]))
+    return results
+
+
+def cmd_bench(args):
+    print(f"{'model':<34} {'mode':<9} {'load(s)':>8} {'RSS(MB)':>8} "
+          f"{'anon(MB)':>9} {'file(MB)':>9}")
+    for model_name in args.models:
+        for mode in ("hub", "snapshot"):
+            results = _run_workers(model_name, mode, args.workers)
+            if not results:
+                print(f"{model_name:<34} {mode:<9} 載入失敗")
+                continue
+            for r in results:
+                print(f"{model_name:<34} {mode:<9} {r['load_s']:>8.2f} "
+                      f"{r.get('VmRSS', 0) / 1024:>8.0f} "
+                      f"{r.get('RssAnon', 0) / 1024:>9.0f} "
+                      f"{r.get('RssFile', 0) / 1024:>9.0f}")
+    print()
+    print("anon 為各行程私有記憶體；file 為 mmap 檔案頁面，"
+          "同一主機上的 worker 共用同一份。")
+    _verify_all(args.models)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模型快照工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    save = sub.add_parser("save", help="建立 safetensors 快照")
+    save.add_argument("--models", nargs="+", default=list(MODEL_CLASSES),
+                      choices=list(MODEL_CLASSES))
+    save.add_argument("--snapshot-dir", default=MODEL_SNAPSHOT_DIR)
+    save.set_defaults(func=cmd_save)
+
+    bench = sub.add_parser("bench", help="比較冷啟動時間與 RSS")
+    bench.add_argument("--models", nargs="+", default=[FINBERT_MODEL_NAME],
+                       choices=list(MODEL_CLASSES))
+    bench.add_argument("--workers", type=int, default=2,
+                       help="同時啟動的 worker 行程數")
+    bench.set_defaults(func=cmd_bench)
+
+    verify = sub.add_parser("verify", help="比對快照與 Hugging Face 的譯文")
+    verify.add_argument("--models", nargs="+", default=list(VERIFY_SAMPLES),
+                        choices=list(VERIFY_SAMPLES))
+    verify.set_defaults(func=cmd_verify)
+
+    load = sub.add_parser("_load")
+    load.add_argument("--model", required=True)
+    load.add_argument("--mode", choices=["hub", "snapshot"], required=True)
+    load.add_argument("--hold", type=float, default=0)
+    load.set_defaults(func=cmd_load)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Callable, Dict
+
+
+class AdmissionRejected(Exception):
+    """佇列已滿或排隊逾時，請求被拒絕"""
+
+    def __init__(self, name: str, retry_after: int):
+        super().__init__(f"{name} 忙碌中，請於 {retry_after} 秒後重試")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """
+    限制某個階段同時執行的數量與等待佇列長度。
+    佇列超過上限或排隊逾時時立即拋出 AdmissionRejected，
+    讓呼叫端快速回應 503 或改用降級模式，而不是無限排隊。
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int,
+                 queue_timeout: float, retry_after: int):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    def is_saturated(self) -> bool:
+        """執行槽已滿且等待佇列已達上限"""
+        return (self.in_flight >= self.max_concurrency
+                and self.waiting >= self.max_queue)
+
+    async def acquire(self):
+        """取得執行槽（需自行呼叫 release）；無法取得時拋出 AdmissionRejected"""
+        if self.is_saturated():
+            self.rejected += 1
+            raise AdmissionRejected(self.name, self.retry_after)
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(),
+                                   self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise AdmissionRejected(self.name, self.retry_after)
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+
+    async def try_acquire(self) -> bool:
+        """有空閒執行槽且無人排隊時立即取得並回傳 True，否則不等待直接回傳 False"""
+        if self._semaphore.locked() or self.waiting:
+            return False
+        await self._semaphore.acquire()  # 未鎖定時不會讓出執行權
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self):
+        """取得一個執行槽；無法在限制內取得時拋出 AdmissionRejected"""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def run_in_thread(self, fn: Callable, *args):
+        """
+        取得執行槽後在執行緒中執行 fn。執行緒無法中斷，
+        等待的協程被取消（例如客戶端斷線）時執行槽仍保留到執行緒結束，
+        確保同時執行的數量不超過 max_concurrency。
+        """
+        await self.acquire()
+        try:
+            future = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+        except BaseException:
+            self.release()
+            raise
+        future.add_done_callback(self._on_thread_done)
+        return await asyncio.shield(future)
+
+    def _on_thread_done(self, future: asyncio.Future):
+        self.release()
+        # 取出被放棄任務的例外，避免 "exception was never retrieved" 警告
+        if not future.cancelled():
+            future.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
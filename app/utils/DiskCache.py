@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional
+
+# 讀取時若距離上次更新存取時間超過此秒數才寫回，減少跨行程的寫入競爭
+ACCESS_UPDATE_INTERVAL = 300
+# 每寫入多少筆檢查一次容量
+EVICT_CHECK_EVERY = 200
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """NFKC 正規化（全形轉半形）並壓縮空白，讓相同內容命中同一筆快取"""
+    text = unicodedata.normalize("NFKC", text or "")
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+class DiskCache:
+    """
+    以 SQLite（WAL 模式）實作的本地持久快取，多個 worker 行程可同時讀取。
+    - key 為正規化文字與模型版本的雜湊，模型版本改變即自然失效
+    - 初始化時刪除同 namespace 中其他版本的資料
+    - 每個 namespace 最多 max_entries 筆，超過時淘汰最久未使用者
+    任何 SQLite 錯誤都視為未命中，不影響請求。
+    """
+
+    def __init__(self, path: str, namespace: str, version: str,
+                 max_entries: int):
+        self.path = path
+        self.namespace = namespace
+        self.version = version
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        try:
+            conn = self._conn()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " namespace TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " version TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " accessed_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_cache_access"
+                " ON cache (namespace, accessed_at)")
+            # 模型版本改變：清除舊版本的資料
+            deleted = conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND version != ?",
+                (namespace, version)).rowcount
+            conn.commit()
+            if deleted:
+                print(f"🧹 {namespace} 快取：模型版本變更，清除 {deleted} 筆")
+        except sqlite3.Error as e:
+            print(f"⚠️ 初始化快取 {namespace} 失敗: {e}")
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 連線不可跨執行緒共用，每個執行緒各自建立
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _key(self, text: str) -> str:
+        raw = f"{self.version}\x00{normalize_text(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[Any]:
+        return self.get_many([text])[0]
+
+    def get_many(self, texts: Iterable[str]) -> List[Optional[Any]]:
+        """批次查詢，未命中的位置為 None"""
+        keys = [self._key(t) for t in texts]
+        found: Dict[str, Any] = {}
+        try:
+            conn = self._conn()
+            now = time.time()
+            stale = []
+            for key in set(keys):
+                row = conn.execute(
+                    "SELECT value, accessed_at FROM cache"
+                    " WHERE namespace = ? AND key = ?",
+                    (self.namespace, key)).fetchone()
+                if row is None:
+                    continue
+                found[key] = json.loads(row[0])
+                if now - row[1] > ACCESS_UPDATE_INTERVAL:
+                    stale.append((now, self.namespace, key))
+            if stale:
+                conn.executemany(
+                    "UPDATE cache SET accessed_at = ?"
+                    " WHERE namespace = ? AND key = ?", stale)
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ 讀取快取 {self.namespace} 失敗: {e}")
+
+        results = [found.get(key) for key in keys]
+        hits = sum(1 for r in results if r is not None)
+        self.hits += hits
+        self.misses += len(results) - hits
+        return results
+
+    def set(self, text: str, value: Any):
+        self.set_many([(text, value)])
+
+    def set_many(self, items: Iterable[tuple]):
+        rows = [(self.namespace, self._key(text), self.version,
+                 json.dumps(value, ensure_ascii=False), time.time())
+                for text, value in items]
+        if not rows:
+            return
+        try:
+            conn = self._conn()
+            conn.executemany(
+                "INSERT OR REPLACE INTO cache"
+                " (namespace, key, version, value, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)", rows)
+            conn.commit()
+            self._writes += len(rows)
+            if self._writes >= EVICT_CHECK_EVERY:
+                self._writes = 0
+                self._evict(conn)
+        except sqlite3.Error as e:
+            print(f"⚠️ 寫入快取 {self.namespace} 失敗: {e}")
+
+    def _evict(self, conn: sqlite3.Connection):
+        """超過 max_entries 時刪除最久未使用的資料"""
+        count = conn.execute("SELECT COUNT(*) FROM cache WHERE namespace = ?",
+                             (self.namespace,)).fetchone()[0]
+        excess = count - self.max_entries
+        if excess <= 0:
+            return
+        conn.execute(
+            "DELETE FROM cache WHERE rowid IN ("
+            " SELECT rowid FROM cache WHERE namespace = ?"
+            " ORDER BY accessed_at LIMIT ?)",
+            (self.namespace, excess))
+        conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"version": self.version, "hits": self.hits,
+                "misses": self.misses}
@@ -0,0 +1,36 @@
+from typing import Dict, Iterable, Sequence
+
+PROC_STATUS = "/proc/self/status"
+
+
+def percentile(values: Iterable[float], q: float) -> float:
+    """取第 q 分位數（0 <= q <= 1，取最接近的樣本，不內插）；values 不可為空"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def read_proc_status(keys: Sequence[str]) -> Dict[str, int]:
+    """
+    從 /proc/self/status 讀取指定欄位（單位 KB），例如 VmRSS、RssFile；
+    非 Linux 平台或欄位不存在時不包含在結果中
+    """
+    memory = {}
+    try:
+        with open(PROC_STATUS) as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in keys:
+                    memory[key] = int(value.split()[0])
+    except OSError:
+        pass
+    return memory
+
+
+def rss_bytes() -> int:
+    """目前行程的 RSS（Linux 讀 /proc，其他平台退回 ru_maxrss）"""
+    rss_kb = read_proc_status(("VmRSS",)).get("VmRSS")
+    if rss_kb is None:
+        import resource
+        rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss_kb * 1024
@@ -0,0 +1,161 @@
+import json
+import os
+import time
+from typing import Dict, Optional
+from config import MODEL_SNAPSHOT_DIR
+
+SNAPSHOT_WEIGHTS = "model.safetensors"
+SNAPSHOT_META = "snapshot.json"
+
+
+class SnapshotMismatch(ValueError):
+    """快照權重與模型架構不符（缺少或多出權重），可能是過期或損毀的快照"""
+
+
+def snapshot_path(model_name: str, snapshot_dir: str = MODEL_SNAPSHOT_DIR
+                  ) -> str:
+    """模型快照目錄，例如 model_snapshots/ProsusAI--finbert"""
+    return os.path.join(snapshot_dir, model_name.replace("/", "--"))
+
+
+def has_snapshot(model_name: str) -> bool:
+    path = snapshot_path(model_name)
+    return (os.path.isfile(os.path.join(path, SNAPSHOT_WEIGHTS))
+            and os.path.isfile(os.path.join(path, "config.json")))
+
+
+def snapshot_info(model_name: str) -> Optional[Dict]:
+    """讀取快照的中繼資料（模型名稱、revision、建立時間）"""
+    meta_path = os.path.join(snapshot_path(model_name), SNAPSHOT_META)
+    if not os.path.isfile(meta_path):
+        return None
+    with open(meta_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def model_version(model_name: str) -> str:
+    """
+    模型版本字串（名稱@revision），用於快取失效判斷。
+    優先使用快照記錄的 revision，其次為 Hugging Face 快取中的 refs/main，
+    兩者都沒有時只用模型名稱。
+    """
+    info = snapshot_info(model_name)
+    if info and info.get("revision"):
+        return f"{model_name}@{info['revision']}"
+    try:
+        from huggingface_hub.constants import HF_HUB_CACHE
+        ref_path = os.path.join(
+            HF_HUB_CACHE, "models--" + model_name.replace("/", "--"),
+            "refs", "main")
+        with open(ref_path, encoding="utf-8") as f:
+            return f"{model_name}@{f.read().strip()}"
+    except (ImportError, OSError):
+        return model_name
+
+
+def load_tokenizer(model_name: str):
+    """優先從本地快照載入 tokenizer，否則走 Hugging Face 快取"""
+    from transformers import AutoTokenizer
+    source = (snapshot_path(model_name) if has_snapshot(model_name)
+              else model_name)
+    return AutoTokenizer.from_pretrained(source)
+
+
+def load_model(model_cls, model_name: str):
+    """
+    載入模型：若有本地快照則以 mmap 方式直接對應 safetensors 權重，
+    多個 worker 行程可透過 OS page cache 共用同一份權重頁面；
+    沒有快照時退回 from_pretrained。
+    """
+    if not has_snapshot(model_name):
+        return model_cls.from_pretrained(model_name)
+    try:
+        return load_snapshot(model_cls, model_name)
+    except SnapshotMismatch as e:
+        # 不可用部分隨機初始化的模型提供服務，改走 Hugging Face 載入
+        print(f"⚠️ {model_name} 快照與模型不符，改用 from_pretrained: {e}")
+        return model_cls.from_pretrained(model_name)
+
+
+def load_snapshot(model_cls, model_name: str):
+    """只從本地快照載入（mmap），權重與模型不符時拋出 SnapshotMismatch"""
+    return _load_mmap_snapshot(model_cls, snapshot_path(model_name))
+
+
+def _load_mmap_snapshot(model_cls, path: str):
+    from safetensors import safe_open
+    from transformers import AutoConfig
+    try:
+        from transformers.modeling_utils import no_init_weights
+    except ImportError:  # 舊版 transformers
+        from contextlib import nullcontext as no_init_weights
+
+    config = AutoConfig.from_pretrained(path)
+    # 權重稍後會被快照取代，跳過隨機初始化以縮短啟動時間
+    with no_init_weights():
+        model = model_cls.from_config(config)
+
+    # safe_open 以 copy-on-write mmap 開啟檔案，取得的 tensor 直接指向對應頁面
+    state_dict = {}
+    with safe_open(os.path.join(path, SNAPSHOT_WEIGHTS),
+                   framework="pt") as f:
+        for key in f.keys():
+            state_dict[key] = f.get_tensor(key)
+
+    # assign=True 讓參數直接使用 mmap 的 tensor，而非複製到新配置的記憶體
+    result = model.load_state_dict(state_dict, strict=False, assign=True)
+    model.tie_weights()
+    # 只允許共用權重（save_pretrained 只存一份）缺少，其餘缺漏或多出的權重
+    # 代表快照過期、截斷或架構不同，繼續使用會以隨機初始化的層提供服務
+    missing = _untied_missing_keys(model, result.missing_keys, state_dict)
+    if missing or result.unexpected_keys:
+        raise SnapshotMismatch(f"缺少 {missing[:5]}（共 {len(missing)}），"
+                               f"多出 {result.unexpected_keys[:5]}"
+                               f"（共 {len(result.unexpected_keys)}）")
+
+    # save_pretrained 會把生成參數（num_beams、max_length、bad_words_ids）
+    # 移到 generation_config.json，from_config 不會讀取，需另外載入，
+    # 否則 MarianMT 會退回貪婪解碼與 max_length=20 而截斷翻譯
+    if model.can_generate():
+        from transformers import GenerationConfig
+        try:
+            model.generation_config = GenerationConfig.from_pretrained(path)
+        except OSError:
+            model.generation_config = GenerationConfig.from_model_config(
+                config)
+    model.eval()
+    return model
+
+
+def _untied_missing_keys(model, missing_keys, state_dict: Dict) -> list:
+    """
+    排除共用權重：tie_weights 後與某個已載入權重共用同一塊記憶體者，
+    雖不在快照中但已有正確的值。
+    """
+    loaded = {tensor.data_ptr() for tensor in state_dict.values()}
+    current = model.state_dict()
+    return [k for k in missing_keys
+            if k not in current or current[k].data_ptr() not in loaded]
+
+
+def save_snapshot(model_cls, model_name: str,
+                  snapshot_dir: str = MODEL_SNAPSHOT_DIR) -> str:
+    """從 Hugging Face 下載模型並存成 safetensors 快照"""
+    from transformers import AutoTokenizer
+    path = snapshot_path(model_name, snapshot_dir)
+    os.makedirs(path, exist_ok=True)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = model_cls.from_pretrained(model_name)
+    model.save_pretrained(path, safe_serialization=True,
+                          max_shard_size="100GB")
+    tokenizer.save_pretrained(path)
+
+    meta = {
+        "model_name": model_name,
+        "revision": getattr(model.config, "_commit_hash", None),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(os.path.join(path, SNAPSHOT_META), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return path
@@ -0,0 +1,270 @@
+import asyncio
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+MAX_STACK_DEPTH = 64
+
+# 葉節點為這些（檔名, 函式）時視為閒置等待，不計入取樣：
+# 等待中的鎖 / 佇列（匯出執行緒等）、閒置的 event loop、
+# 等待工作的執行緒池 worker（SimpleQueue.get 為 C 實作，葉節點即 _worker）
+IDLE_LEAF_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+
+
+# 目前請求的 capture 編號；middleware 在 begin 時設定，
+# event loop 上的子 task 與 to_thread 都會複製 context 而繼承
+_request_tag: ContextVar[Optional[int]] = ContextVar("profile_request_tag",
+                                                     default=None)
+# worker 執行緒 ident -> 正在服務的 capture 編號（由 TaggedExecutor 維護）
+_thread_tags: Dict[int, int] = {}
+_tag_counter = itertools.count(1)
+
+
+class Capture:
+    """單一請求的擷取：編號（對應取樣的歸屬）與起始時間"""
+
+    def __init__(self, reason: Optional[str]):
+        self.reason = reason
+        self.tag = next(_tag_counter)
+        self.start = time.monotonic()
+
+
+def _run_tagged(tag: int, fn, *args, **kwargs):
+    thread_id = threading.get_ident()
+    _thread_tags[thread_id] = tag
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _thread_tags.pop(thread_id, None)
+
+
+class TaggedExecutor(ThreadPoolExecutor):
+    """
+    event loop 的預設執行緒池：提交工作時讀取呼叫端 context 中的
+    capture 編號，讓取樣執行緒能把 worker 的堆疊歸屬到發出請求的 task。
+    """
+
+    def submit(self, fn, /, *args, **kwargs):
+        tag = _request_tag.get()
+        if tag is None:
+            return super().submit(fn, *args, **kwargs)
+        return super().submit(_run_tagged, tag, fn, *args, **kwargs)
+
+
+class StackSampler:
+    """
+    以單一背景執行緒定期擷取堆疊（sys._current_frames），
+    只在有進行中的 Capture 時運作，沒有擷取時執行緒會結束。
+    每次取樣只處理屬於某個擷取中請求的執行緒：event loop 上正在執行
+    該請求 task 的時刻，以及替它執行 to_thread 的 worker；
+    結果以（時間, capture 編號, folded stack）存入共用的環形緩衝，
+    請求結束時再依時間區間與編號切出，成本與同時擷取的請求數無關。
+    閒置等待中的執行緒（見 IDLE_LEAF_FRAMES）不計入。
+    FastAPI 同步端點使用 anyio 的執行緒，不在歸屬範圍內。
+    """
+
+    def __init__(self, interval: float, buffer_size: int):
+        self.interval = interval
+        self._samples: deque = deque(maxlen=buffer_size)
+        self._ticks: deque = deque(maxlen=buffer_size)
+        self._active = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+
+    def watch_loop(self, loop: asyncio.AbstractEventLoop, thread_id: int):
+        self._loop = loop
+        self._loop_thread = thread_id
+
+    def begin(self):
+        with self._lock:
+            self._active += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name="stack-sampler",
+                                                daemon=True)
+                self._thread.start()
+
+    def end(self):
+        with self._lock:
+            self._active -= 1
+
+    def collect(self, tag: int, start: float, end: float):
+        """
+        切出 [start, end] 內屬於 tag 的取樣，
+        回傳（folded stack 計數, 取樣次數, 區間開頭是否已被覆寫）
+        """
+        stacks: Counter = Counter()
+        with self._lock:
+            for timestamp, sample_tag, stack in reversed(self._samples):
+                if timestamp < start:
+                    break
+                if sample_tag == tag and timestamp <= end:
+                    stacks[stack] += 1
+            ticks = 0
+            for timestamp in reversed(self._ticks):
+                if timestamp < start:
+                    break
+                if timestamp <= end:
+                    ticks += 1
+            truncated = (len(self._samples) == self._samples.maxlen
+                         and self._samples[0][0] > start)
+        return stacks, ticks, truncated
+
+    def _tag_of(self, thread_id: int) -> Optional[int]:
+        if thread_id == self._loop_thread:
+            task = asyncio.current_task(self._loop)
+            return task.get_context().get(_request_tag) if task else None
+        return _thread_tags.get(thread_id)
+
+    def _run(self):
+        try:
+            self._sample_loop()
+        except Exception as e:
+            # 清除執行緒狀態，下一次擷取會重新啟動取樣
+            print(f"⚠️ 堆疊取樣執行緒發生錯誤: {e}")
+            with self._lock:
+                self._thread = None
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+
+            now = time.monotonic()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            entries = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                tag = self._tag_of(thread_id)
+                if tag is None or self._is_idle(frame):
+                    continue
+                entries.append((now, tag, self._fold(
+                    names.get(thread_id, str(thread_id)), frame)))
+            with self._lock:
+                self._ticks.append(now)
+                self._samples.extend(entries)
+            time.sleep(self.interval)
+
+    @staticmethod
+    def _is_idle(frame) -> bool:
+        code = frame.f_code
+        return ((os.path.basename(code.co_filename), code.co_name)
+                in IDLE_LEAF_FRAMES)
+
+    @staticmethod
+    def _fold(thread_name: str, frame) -> str:
+        """轉成 flamegraph 使用的 folded 格式（由根到葉，以 ; 分隔）"""
+        parts: List[str] = []
+        while frame is not None and len(parts) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            parts.append(f"{code.co_name} "
+                         f"({os.path.basename(code.co_filename)}"
+                         f":{frame.f_lineno})")
+            frame = frame.f_back
+        parts.append(thread_name)
+        return ";".join(reversed(parts))
+
+
+class RequestProfiler:
+    """
+    依管理者 header、取樣率或延遲門檻擷取請求的堆疊取樣，
+    只保留最近 buffer_size 筆 trace。
+    """
+
+    def __init__(self, admin_token: str, sample_rate: float,
+                 slow_threshold: float, buffer_size: int, interval: float,
+                 sample_buffer: int):
+        self.admin_token = admin_token
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.sampler = StackSampler(interval, sample_buffer)
+        self.traces: deque = deque(maxlen=buffer_size)
+        self._traces_lock = threading.Lock()
+
+    def install(self, loop: asyncio.AbstractEventLoop):
+        """
+        於 event loop 執行緒上呼叫（啟動時）：記錄 loop 以辨識請求 task，
+        並換上 TaggedExecutor 讓 to_thread 的 worker 可歸屬到請求
+        """
+        self.sampler.watch_loop(loop, threading.get_ident())
+        loop.set_default_executor(
+            TaggedExecutor(thread_name_prefix="asyncio"))
+
+    def begin(self, profile_header: Optional[str]) -> Optional[Capture]:
+        """
+        決定是否擷取此請求；不擷取時回傳 None。
+        擷取時在目前 context 設定 capture 編號，需在請求的 task 中呼叫。
+        """
+        if self.admin_token and profile_header == self.admin_token:
+            reason = "header"
+        elif self.sample_rate > 0 and random.random() < self.sample_rate:
+            reason = "sampled"
+        elif self.slow_threshold > 0:
+            # 是否保留要等請求結束、確認延遲後才知道
+            reason = None
+        else:
+            return None
+        capture = Capture(reason)
+        _request_tag.set(capture.tag)
+        self.sampler.begin()
+        return capture
+
+    def finish(self, capture: Capture, method: str, path: str,
+               status: int, duration: float):
+        self.sampler.end()
+        reason = capture.reason
+        if reason is None:
+            if duration < self.slow_threshold:
+                return
+            reason = "slow"
+
+        stacks, ticks, truncated = self.sampler.collect(
+            capture.tag, capture.start, time.monotonic())
+        trace = {
+            "id": uuid.uuid4().hex[:12],
+            "captured_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "method": method,
+            "path": path,
+            "status": status,
+            "duration_ms": round(duration * 1000, 1),
+            "reason": reason,
+            "samples": ticks,
+            # 請求太長、緩衝已覆寫區間開頭時，stacks 只涵蓋後段
+            "truncated": truncated,
+            "stacks": stacks.most_common(),
+        }
+        with self._traces_lock:
+            self.traces.append(trace)
+
+    def list_traces(self) -> List[Dict]:
+        with self._traces_lock:
+            traces = list(self.traces)
+        return [{k: v for k, v in t.items() if k != "stacks"}
+                for t in reversed(traces)]
+
+    def get_trace(self, trace_id: str) -> Optional[Dict]:
+        with self._traces_lock:
+            for trace in self.traces:
+                if trace["id"] == trace_id:
+                    return trace
+        return None
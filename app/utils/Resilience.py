@@ -0,0 +1,168 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+from utils.Metrics import percentile
+
+
+class CircuitOpen(Exception):
+    """斷路器開啟中，暫停呼叫外部服務"""
+
+
+class LatencyTracker:
+    """保留最近 window 筆成功呼叫的延遲，用於計算 hedging 門檻"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self._samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """樣本不足時回傳 None（不進行 hedging）"""
+        if len(self._samples) < self.min_samples:
+            return None
+        return percentile(self._samples, q)
+
+
+class HedgeBudget:
+    """
+    hedged 請求的預算（token bucket）：每次呼叫存入 ratio 個 token，
+    上限 burst 個，每個 hedged 請求花費 1 個。
+    長期而言 hedged 請求數不超過呼叫數的 ratio，上游變慢時不會讓負載加倍。
+    """
+
+    def __init__(self, ratio: float, burst: float = 10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = 0.0
+        self.hedged = 0
+
+    def deposit(self):
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def available(self) -> bool:
+        return self.tokens >= 1.0
+
+    def spend(self):
+        self.tokens -= 1.0
+        self.hedged += 1
+
+
+class CircuitBreaker:
+    """
+    連續失敗達 failure_threshold 次後開啟，cooldown 秒內直接拒絕呼叫；
+    冷卻結束後放行一次試探呼叫（half-open），成功即關閉、失敗則重新開啟。
+    """
+
+    def __init__(self, name: str, failure_threshold: int, cooldown: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def release_trial(self):
+        """呼叫未實際送出（例如本地排隊被拒），釋放試探名額但不計成敗"""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        was_open = self.opened_at is not None
+        self.failures += 1
+        if self._trial_in_flight or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            if not was_open:
+                print(f"⚠️ {self.name} 斷路器開啟，"
+                      f"{self.cooldown:.0f} 秒內改用本地模板")
+        self._trial_in_flight = False
+
+    def stats(self):
+        return {"state": self.state, "failures": self.failures}
+
+
+def _discard_result(task: asyncio.Future):
+    # 取出被放棄任務的例外，避免 "exception was never retrieved" 警告
+    if not task.cancelled():
+        task.exception()
+
+
+async def call_with_deadline(
+        fn: Callable, deadline: float,
+        hedge_after: Optional[float] = None,
+        try_hedge: Optional[Callable[[], Awaitable[bool]]] = None,
+        on_thread_done: Optional[Callable[[], None]] = None):
+    """
+    在執行緒中執行同步函式 fn，最多等待 deadline 秒（逾時拋出 TimeoutError）。
+    若指定 hedge_after 且第一個請求超過該秒數仍未完成，會再送出一個相同請求，
+    取先成功者；try_hedge 回傳 False 時（例如沒有空閒執行槽或超出預算）不送出。
+    執行緒無法中斷，被放棄的請求會在背景自行結束；
+    on_thread_done 在每個執行緒真正結束時呼叫，用於釋放其佔用的資源。
+    """
+    if deadline <= 0:
+        raise asyncio.TimeoutError()
+
+    def start() -> asyncio.Future:
+        task = asyncio.ensure_future(asyncio.to_thread(fn))
+        task.add_done_callback(_discard_result)
+        if on_thread_done is not None:
+            task.add_done_callback(lambda _: on_thread_done())
+        return task
+
+    loop = asyncio.get_running_loop()
+    end = loop.time() + deadline
+    pending = {start()}
+    hedged = hedge_after is None or hedge_after >= deadline
+    last_error: Optional[BaseException] = None
+
+    while pending:
+        remaining = end - loop.time()
+        if remaining <= 0:
+            break
+        timeout = remaining
+        if not hedged:
+            timeout = min(remaining, max(0.0, hedge_after - (
+                deadline - remaining)))
+
+        # 不取消 pending 的任務：取消只會讓 future 提早完成，執行緒仍在執行
+        done, pending = await asyncio.wait(
+            pending, timeout=timeout,
+            return_when=asyncio.FIRST_COMPLETED)
+
+        for task in done:
+            if task.exception() is None:
+                return task.result()
+            last_error = task.exception()
+
+        if not done and not hedged:
+            # 第一個請求超過延遲門檻，在允許時送出 hedged 請求
+            hedged = True
+            if try_hedge is None or await try_hedge():
+                pending.add(start())
+
+    if last_error is not None and not pending:
+        raise last_error
+    raise asyncio.TimeoutError()
@@ -0,0 +1,70 @@
+import hashlib
+import json
+import re
+import secrets
+import threading
+import time
+from typing import Optional
+
+# 錄製的端點
+RECORDED_PATHS = {
+    "/questionnaire/start",
+    "/questionnaire/answer",
+    "/questionnaire/stream-question",
+    "/questionnaire/save-question",
+}
+
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_DIGITS_RE = re.compile(r"\d{6,}")
+
+
+class TrafficRecorder:
+    """
+    將請求時間軸匿名化後寫成 JSONL，每行一筆：
+    {"t": 相對錄製開始的秒數, "endpoint", "session", "answer", "status", "latency_ms"}
+    session 以每次錄製的隨機鹽值雜湊，answer 會遮蔽 email 與長數字串。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._salt = secrets.token_hex(8)
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+        # 行緩衝，每筆寫入即落地，行程異常結束也不會遺失已錄製的請求
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+        print(f"🎙️ 流量錄製已啟用: {path}")
+
+    def now(self) -> float:
+        """相對錄製開始的秒數"""
+        return time.monotonic() - self._start
+
+    def anonymize_session(self, session_id: Optional[str]) -> Optional[str]:
+        if not session_id or not isinstance(session_id, str):
+            return None
+        digest = hashlib.sha256((self._salt + session_id).encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    @staticmethod
+    def scrub(text: Optional[str]) -> Optional[str]:
+        """遮蔽回答中可能的個資（email、電話 / 證件號碼等長數字串）"""
+        if not text or not isinstance(text, str):
+            return None
+        text = _EMAIL_RE.sub("<email>", text)
+        return _DIGITS_RE.sub(lambda m: "0" * len(m.group()), text)
+
+    def record(self, t: float, endpoint: str, session_id: Optional[str],
+               answer: Optional[str], status: int, latency: float):
+        line = json.dumps({
+            "t": round(t, 4),
+            "endpoint": endpoint,
+            "session": self.anonymize_session(session_id),
+            "answer": self.scrub(answer),
+            "status": status,
+            "latency_ms": round(latency * 1000, 1),
+        }, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
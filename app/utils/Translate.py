@@ -1,18 +1,58 @@
-from transformers import pipeline
+from config import (TRANSLATOR_ZH_EN_MODEL, TRANSLATOR_EN_ZH_MODEL,
+                    CACHE_ENABLED, CACHE_DB_PATH, CACHE_MAX_ENTRIES)
+from utils.DiskCache import DiskCache
+from utils.ModelLoader import load_model, load_tokenizer, model_version
+
+
+def _translation_pipeline(model_name):
+    # 透過 ModelLoader 載入，有本地快照時以 mmap 方式對應權重
+    from transformers import AutoModelForSeq2SeqLM, pipeline
+    return pipeline("translation",
+                    model=load_model(AutoModelForSeq2SeqLM, model_name),
+                    tokenizer=load_tokenizer(model_name))
 
 
 class Translator:
     def __init__(self):
-        pass
+        # 翻譯模型只建立一次並重複使用，避免每次呼叫都重新載入模型
+        self._zh_en = None
+        self._en_zh = None
+        # 中譯英結果的持久快取，新啟動的 worker 也能直接命中
+        self.cache = (DiskCache(CACHE_DB_PATH, "translate_zh_en",
+                                model_version(TRANSLATOR_ZH_EN_MODEL),
+                                CACHE_MAX_ENTRIES)
+                      if CACHE_ENABLED else None)
+
+    def _get_zh_en(self):
+        if self._zh_en is None:
+            self._zh_en = _translation_pipeline(TRANSLATOR_ZH_EN_MODEL)
+        return self._zh_en
+
+    def _get_en_zh(self):
+        if self._en_zh is None:
+            self._en_zh = _translation_pipeline(TRANSLATOR_EN_ZH_MODEL)
+        return self._en_zh
 
     def translate_zn_en(self, text):
-        translator = pipeline("translation",
-                              model="Helsinki-NLP/opus-mt-zh-en")
-        result = translator(text)
-        return result[0]['translation_text']
+        return self.translate_batch([text])[0]
+
+    def translate_batch(self, texts):
+        """批次中譯英，回傳與輸入順序相同的譯文列表（只翻譯快取未命中者）"""
+        texts = list(texts)
+        if not texts:
+            return []
+        translations = (self.cache.get_many(texts) if self.cache
+                        else [None] * len(texts))
+        missing = [i for i, t in enumerate(translations) if t is None]
+        if missing:
+            results = self._get_zh_en()([texts[i] for i in missing])
+            for i, r in zip(missing, results):
+                translations[i] = r['translation_text']
+            if self.cache:
+                self.cache.set_many((texts[i], translations[i])
+                                    for i in missing)
+        return translations
 
     def translate_en_zn(self, text):
-        translator = pipeline("translation",
-                              model="Helsinki-NLP/opus-mt-en-zh")
-        result = translator(text)
+        result = self._get_en_zh()(text)
         return result[0]['translation_text']
@@ -0,0 +1,234 @@
+"""
+記憶體預算回歸測試（離線執行，預設使用 stub 情緒分析後端）。
+
+用法（於專案根目錄執行）：
+    python test/memory_budget.py
+    python test/memory_budget.py --analyze-calls 500 --session-kb 12
+
+以小型模型實際跑翻譯 + FinBERT 流程（需可取得模型或已有快照）：
+    SENTIMENT_BACKEND=finbert MODEL_DEVICE=-1 \\
+    FINBERT_MODEL_NAME=hf-internal-testing/tiny-random-BertForSequenceClassification \\
+    TRANSLATOR_ZH_EN_MODEL=hf-internal-testing/tiny-random-MarianMTModel \\
+    python test/memory_budget.py --startup-peak-mb 512
+
+檢查項目（任一超過預算即以 exit code 1 結束）：
+- startup：載入服務與模型時的 tracemalloc 峰值與 RSS 增量
+- analyze：暖機後重複分析，tracemalloc 與 RSS 必須持平（不隨呼叫次數成長）
+- translator：以會配置記憶體的假 pipeline 取代 MarianMT，經由 Translator
+  重複翻譯，pipeline 只能建立一次，且配置峰值不可隨呼叫次數累積
+- sessions：每個完成作答的會話佔用的位元組數，以及會話數上限是否生效
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+sys.path.insert(0, APP_DIR)
+
+# 離線執行：預設不載入模型、不呼叫 Gemini
+os.environ.setdefault("SENTIMENT_BACKEND", "stub")
+os.environ["GOOGLE_API_KEY"] = ""
+# 關閉持久快取，否則暖機後的呼叫全部命中 SQLite，量不到翻譯與模型推論
+os.environ["CACHE_ENABLED"] = "0"
+
+from utils.Metrics import rss_bytes  # noqa: E402
+
+MB = 1024 * 1024
+KB = 1024
+
+
+class Report:
+    def __init__(self):
+        self.rows = []
+
+    def check(self, name: str, measured: float, budget: float, unit: str):
+        ok = measured <= budget
+        self.rows.append((name, measured, budget, unit, ok))
+        status = "PASS" if ok else "FAIL"
+        print(f"  [{status}] {name}: {measured:,.1f} {unit}"
+              f"（預算 {budget:,.1f} {unit}）")
+
+    @property
+    def failed(self):
+        return [row for row in self.rows if not row[4]]
+
+
+def check_startup(args, report: Report):
+    print("▶ startup：載入服務與模型")
+    gc.collect()
+    rss_before = rss_bytes()
+    tracemalloc.start()
+    import services  # noqa: F401  觸發模型與服務初始化
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_delta = rss_bytes() - rss_before
+
+    report.check("startup tracemalloc peak", peak / MB,
+                 args.startup_peak_mb, "MB")
+    report.check("startup RSS delta", rss_delta / MB,
+                 args.startup_rss_mb, "MB")
+
+
+def check_analyze_plateau(args, report: Report):
+    print(f"▶ analyze：暖機 {args.warmup_calls} 次後再呼叫 "
+          f"{args.analyze_calls} 次")
+    from services import analysisService
+    from services.gemini_service import GeminiService
+
+    questions = [GeminiService.fallback_question(q) for q in
+                 ("emotion_mc", "stress_likert", "risk_mc", "decision_mc")]
+    answers = ["冷靜觀望", "5 — 非常焦慮", "高風險高報酬", "分析公司基本面"]
+
+    def run(n):
+        for i in range(n):
+            question = questions[i % len(questions)]
+            analysisService.analyze_user_response(
+                answers[i % len(answers)], question,
+                analysisService.translate_question(question))
+
+    run(args.warmup_calls)
+    gc.collect()
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    rss_before = rss_bytes()
+
+    run(args.analyze_calls)
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    report.check("analyze tracemalloc growth", (current - baseline) / KB,
+                 args.analyze_growth_kb, "KB")
+    report.check("analyze RSS growth", (rss_bytes() - rss_before) / MB,
+                 args.analyze_rss_mb, "MB")
+
+
+def check_translator(args, report: Report):
+    print(f"▶ translator：假 pipeline（每個 {args.fake_model_mb:.0f} MB）"
+          f"翻譯 {args.analyze_calls} 次")
+    from utils import Translate
+
+    builds = []
+
+    def fake_pipeline(model_name):
+        # 模擬模型權重的配置，每次建立 pipeline 都會佔用 fake_model_mb
+        weights = bytearray(int(args.fake_model_mb * MB))
+        builds.append(model_name)
+
+        def translate(texts):
+            if isinstance(texts, str):
+                texts = [texts]
+            return [{"translation_text": f"en({len(weights)}):{text}"}
+                    for text in texts]
+        return translate
+
+    original = Translate._translation_pipeline
+    Translate._translation_pipeline = fake_pipeline
+    try:
+        translator = Translate.Translator()
+        answers = ["冷靜觀望", "想立刻賣出", "加碼買進", "分析公司基本面"]
+
+        def run(n):
+            for i in range(n):
+                translator.translate_zn_en(f"{answers[i % len(answers)]} {i}")
+
+        run(args.warmup_calls)
+        gc.collect()
+        tracemalloc.start()
+        baseline, _ = tracemalloc.get_traced_memory()
+        run(args.analyze_calls)
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        Translate._translation_pipeline = original
+
+    report.check("translator pipeline builds", len(builds), 1, "次")
+    # 每次呼叫都重建 pipeline 時，即使用完釋放，峰值也會超過一份假權重
+    report.check("translate tracemalloc peak", (peak - baseline) / MB,
+                 args.fake_model_mb / 2, "MB")
+    report.check("translate tracemalloc growth", (current - baseline) / KB,
+                 args.analyze_growth_kb, "KB")
+
+
+def _fill_session(service, session_id: str, total: int):
+    sentiment = {"negative": 0.1, "neutral": 0.7, "positive": 0.2}
+    for i in range(total):
+        question = f"第 {i + 1} 題：當股市短期暴跌 10% 時，您通常會怎麼做？ 冷靜觀望 / 想立刻賣出 / 加碼買進"
+        service.save_generated_question(session_id, question,
+                                        "When the market drops 10%...")
+        service.save_response(session_id, "冷靜觀望，等待市場回穩", sentiment, {})
+
+
+def check_sessions(args, report: Report):
+    print(f"▶ sessions：建立 {args.sessions} 個完成作答的會話")
+    from services.questionnaire_service import QuestionnaireService
+
+    service = QuestionnaireService(max_sessions=args.sessions)
+    gc.collect()
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    for _ in range(args.sessions):
+        _fill_session(service, service.create_session(),
+                      service.total_questions)
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    per_session = (current - baseline) / args.sessions
+    report.check("bytes per session", per_session / KB,
+                 args.session_kb, "KB")
+
+    # 會話數上限：超出後舊會話必須被淘汰
+    bounded = QuestionnaireService(max_sessions=100)
+    for _ in range(1000):
+        bounded.create_session()
+    report.check("sessions kept with max_sessions=100",
+                 len(bounded.sessions), 100, "個")
+
+
+CHECKS = {
+    "startup": check_startup,
+    "analyze": check_analyze_plateau,
+    "translator": check_translator,
+    "sessions": check_sessions,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="記憶體預算回歸測試")
+    parser.add_argument("--checks", nargs="+", default=list(CHECKS),
+                        choices=list(CHECKS))
+    parser.add_argument("--startup-peak-mb", type=float,
+                        default=float(os.getenv("MEM_STARTUP_PEAK_MB", 64)))
+    parser.add_argument("--startup-rss-mb", type=float,
+                        default=float(os.getenv("MEM_STARTUP_RSS_MB", 256)))
+    parser.add_argument("--warmup-calls", type=int, default=50)
+    parser.add_argument("--analyze-calls", type=int, default=300)
+    parser.add_argument("--analyze-growth-kb", type=float,
+                        default=float(os.getenv("MEM_ANALYZE_GROWTH_KB", 256)))
+    parser.add_argument("--analyze-rss-mb", type=float,
+                        default=float(os.getenv("MEM_ANALYZE_RSS_MB", 32)))
+    parser.add_argument("--fake-model-mb", type=float, default=8,
+                        help="translator 檢查中假 pipeline 配置的大小")
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--session-kb", type=float,
+                        default=float(os.getenv("MEM_SESSION_KB", 16)))
+    args = parser.parse_args()
+
+    report = Report()
+    # startup 必須最先執行，才能量到首次載入
+    for name in CHECKS:
+        if name in args.checks:
+            CHECKS[name](args, report)
+
+    if report.failed:
+        print(f"❌ {len(report.failed)} 項超過記憶體預算")
+        sys.exit(1)
+    print("✅ 所有記憶體檢查皆在預算內")
+
+
+if __name__ == "__main__":
+    main()